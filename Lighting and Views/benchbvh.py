@@ -0,0 +1,90 @@
+import numpy as np
+import assets
+import time
+import bvh
+import render
+import transformations as trans
+from scene import Scene
+
+# Build time and query throughput of the bounding volume hierarchy
+# The frustum query visits the nodes of the tree and not every triangle, the picking casts a ray through every pixel
+# instead of rendering the view again
+
+# The arrays are memory mapped from h3.assets (written from h3.npy the first time)
+data_dict = assets.load('h3.npy')
+
+#Extract the data
+verts = data_dict['verts']
+vert_colors = data_dict['vertex_colors'].T
+faces = data_dict['face_indices']
+eye = data_dict['cam_eye']
+up = data_dict['cam_up']
+target = data_dict['cam_lookat']
+ka = data_dict['ka']
+kd = data_dict['kd']
+ks = data_dict['ks']
+n = data_dict['n']
+light_positions = data_dict['light_positions']
+light_intensities = data_dict['light_intensities']
+Ia = data_dict['Ia'].T
+M = data_dict['M']
+N = data_dict['N']
+W = data_dict['W']
+H = data_dict['H']
+bg_color = data_dict['bg_color'].T
+focal = data_dict['focal']
+
+def timeit(func, repeat=3):
+    # returns the best time of some runs of func
+    best = np.inf
+    for _ in range(repeat):
+        start_time = time.time()
+        func()
+        best = min(best, time.time() - start_time)
+    return best
+
+# A large scene: copies of the object on a k x k grid
+def grid(k):
+    size = np.max(verts, axis=1) - np.min(verts, axis=1)
+    offsets = np.stack(np.meshgrid(np.arange(k), np.arange(k), [0]), axis=0).reshape(3, -1) * size[:, np.newaxis] * 1.1
+    grid_verts = (verts[:, np.newaxis, :] + offsets[:, :, np.newaxis]).reshape(3, -1)
+    grid_faces = (faces[:, np.newaxis, :] + verts.shape[1] * np.arange(k * k)[np.newaxis, :, np.newaxis]).reshape(3, -1)
+    return grid_verts, grid_faces
+
+# Build time
+for k in [1, 4, 16]:
+    grid_verts, grid_faces = grid(k)
+    build_time = timeit(lambda: bvh.build_bvh(grid_verts, grid_faces))
+    print(grid_faces.shape[1], "triangles - build:", round(build_time, 4), "sec,", round(grid_faces.shape[1] / build_time / 1e6, 2), "Mtriangles/sec")
+
+# Frustum query and the culling of all the triangles, for the camera of the object and a camera zoomed into the large scene
+grid_verts, grid_faces = grid(16)
+tree = bvh.build_bvh(grid_verts, grid_faces)
+center = np.mean(verts, axis=1)
+for name, camera_eye, camera_target in [("whole scene", eye, target), ("zoomed", center + np.array([0, 0, 1.0]), center)]:
+    def cull():
+        R, t = trans.lookat(camera_eye, up, camera_target)
+        pixel_coords, depth_values = trans.project_vertices(grid_verts, focal, R, t, W, H, N, M)
+        return trans.cull_triangles(grid_verts, grid_faces, camera_eye, pixel_coords, depth_values, M, N)
+    keep = bvh.frustum_triangles(tree, focal, camera_eye, camera_target, up, M, N, H, W)
+    print(name, "- frustum keeps", int(np.count_nonzero(keep)), "of", grid_faces.shape[1], "triangles, query:",
+          round(timeit(lambda: bvh.frustum_triangles(tree, focal, camera_eye, camera_target, up, M, N, H, W)), 4), "sec, cull_triangles:",
+          round(timeit(cull), 4), "sec")
+
+# Picking: a ray through every pixel of the view and a small batch of pixels
+tree = bvh.build_bvh(verts, faces)
+ys, xs = np.mgrid[0:M, 0:N]
+for name, pick_xs, pick_ys in [("all the pixels", xs.ravel(), ys.ravel()), ("1000 pixels", xs.ravel()[::M * N // 1000], ys.ravel()[::M * N // 1000])]:
+    pick_time = timeit(lambda: bvh.pick(tree, verts, faces, pick_xs, pick_ys, focal, eye, target, up, M, N, H, W))
+    # every pixel casts 4 rays (the wrap around of the negative coordinates)
+    print("pick", name, ":", round(pick_time, 4), "sec,", round(4 * len(pick_xs) / pick_time / 1e6, 2), "Mrays/sec")
+
+# The render that the picking replaces and a zoomed render with and without the frustum query
+scene = Scene()
+render_time = timeit(lambda: render.render_object("gouraud", focal, eye, target, up, bg_color, M, N, H, W,
+                    verts, vert_colors, faces, ka, kd, ks, n, light_positions, light_intensities, Ia, zbuffer=True, scene=scene), repeat=1)
+print("render of the view:", round(render_time, 4), "sec")
+for frustum in [False, True]:
+    render_time = timeit(lambda: render.render_object("gouraud", focal, center + np.array([0, 0, 1.0]), center, up, bg_color, M, N, H, W,
+                    verts, vert_colors, faces, ka, kd, ks, n, light_positions, light_intensities, Ia, zbuffer=True, scene=scene, frustum=frustum))
+    print("zoomed render, frustum", frustum, ":", round(render_time, 4), "sec")
\ No newline at end of file
@@ -0,0 +1,63 @@
+import numpy as np
+import assets
+import time
+import render
+import lod
+from scene import Scene
+
+# Render time of the object far from the camera with and without the levels of detail
+# and the difference of the two images (the pixels that change and the mean difference of the colors)
+
+# The arrays are memory mapped from h3.assets (written from h3.npy the first time)
+data_dict = assets.load('h3.npy')
+
+#Extract the data
+verts = data_dict['verts']
+vert_colors = data_dict['vertex_colors'].T
+faces = data_dict['face_indices']
+eye = data_dict['cam_eye']
+up = data_dict['cam_up']
+target = data_dict['cam_lookat']
+ka = data_dict['ka']
+kd = data_dict['kd']
+ks = data_dict['ks']
+n = data_dict['n']
+light_positions = data_dict['light_positions']
+light_intensities = data_dict['light_intensities']
+Ia = data_dict['Ia'].T
+M = data_dict['M']
+N = data_dict['N']
+W = data_dict['W']
+H = data_dict['H']
+bg_color = data_dict['bg_color'].T
+focal = data_dict['focal']
+
+def timeit(func, repeat=3):
+    # returns the best time of some runs of func
+    best = np.inf
+    for _ in range(repeat):
+        start_time = time.time()
+        func()
+        best = min(best, time.time() - start_time)
+    return best
+
+# The levels of the object
+build_time = timeit(lambda: lod.build_levels(verts, vert_colors, faces))
+levels = lod.build_levels(verts, vert_colors, faces)
+print("levels:", [level["faces"].shape[1] for level in levels], "triangles, built in", round(build_time, 4), "sec")
+
+# The camera moves away from the target along the same line
+scene = Scene()
+for distance in [1, 4, 8, 16, 32]:
+    camera_eye = target + (eye - target) * distance
+    level = lod.select_level(levels, focal, camera_eye, target, up, M, N, H, W)
+    for shader in ["gouraud", "phong"]:
+        images = {}
+        times = {}
+        for use_lod in [False, True]:
+            times[use_lod] = timeit(lambda: images.__setitem__(use_lod, render.render_object(shader, focal, camera_eye, target, up, bg_color, M, N, H, W,
+                                    verts, vert_colors, faces, ka, kd, ks, n, light_positions, light_intensities, Ia, zbuffer=True, scene=scene, lod=use_lod)))
+        difference = np.abs(images[True] - images[False])
+        print(distance, "x distance,", shader, "- level", level, "- render:", round(times[False], 3), "sec, with lod:", round(times[True], 3),
+              "sec, speedup", round(times[False] / times[True], 1), "- pixels that differ:", int(np.count_nonzero(np.max(difference, axis=-1) > 1e-6)),
+              "mean difference:", round(float(np.mean(difference)), 6))
\ No newline at end of file
@@ -0,0 +1,80 @@
+import numpy as np
+import assets
+import cv2
+import time
+import tmap as map
+from scene import Scene
+
+# Sample throughput of the texture with and without mipmaps
+# The farther a surface is, the more texels one pixel covers and the bilinear reads of the full texture jump around in memory,
+# the trilinear reads go to the level where neighbouring pixels read neighbouring texels
+
+# The arrays are memory mapped from h3.assets (written from h3.npy the first time)
+data_dict = assets.load('h3.npy')
+
+#Extract the data
+verts = data_dict['verts']
+vert_colors = data_dict['vertex_colors'].T
+faces = data_dict['face_indices']
+uvs = data_dict['uvs']
+face_uvs = data_dict['face_uv_indices'].T
+eye = data_dict['cam_eye']
+up = data_dict['cam_up']
+target = data_dict['cam_lookat']
+ka = data_dict['ka']
+kd = data_dict['kd']
+ks = data_dict['ks']
+n = data_dict['n']
+light_positions = data_dict['light_positions']
+light_intensities = data_dict['light_intensities']
+Ia = data_dict['Ia'].T
+M = data_dict['M']
+N = data_dict['N']
+W = data_dict['W']
+H = data_dict['H']
+bg_color = data_dict['bg_color'].T
+focal = data_dict['focal']
+
+text_map = cv2.imread('images/cat_diff.png')
+text_map = cv2.cvtColor(text_map, cv2.COLOR_BGR2RGB)
+text_map = text_map / 255.0
+# The same texture as uint8 memory mapped assets (normalized when it is sampled)
+texture_assets = assets.load_texture('images/cat_diff.png', map.build_mipmaps)
+
+def timeit(func, repeat=3):
+    # returns the best time of some runs of func
+    best = np.inf
+    for _ in range(repeat):
+        start_time = time.time()
+        func()
+        best = min(best, time.time() - start_time)
+    return best
+
+# Memory of the mipmaps compared with the texture at the same type
+for dtype in [np.float32, np.uint8]:
+    mipmaps = map.build_mipmaps(text_map, dtype)
+    print(np.dtype(dtype).name, "mipmaps:", len(mipmaps["levels"]), "levels,", mipmaps["texels"].nbytes / mipmaps["levels"][0].nbytes, "x the texture")
+
+# A surface which covers s x s pixels of the image and shows all the texture, 2^20 samples for every distance
+mipmaps32 = map.build_mipmaps(text_map, np.float32)
+mipmaps8 = map.build_mipmaps(text_map, np.uint8)
+samples = 1 << 20
+for s in [512, 256, 128, 64, 32]:
+    u, v = np.meshgrid(np.linspace(0, 1, s), np.linspace(0, 1, s))
+    uv = np.tile(np.stack([u.ravel(), v.ravel()], axis=1), (samples // (s * s), 1))
+    lod = np.full(len(uv), 0.5 * np.log2((text_map.shape[0] - 1) * (text_map.shape[1] - 1) / (s * s)))
+    t_bilinear = timeit(lambda: map.bilerp_array(uv, text_map))
+    t_trilinear32 = timeit(lambda: map.trilinear(uv, lod, mipmaps32))
+    t_trilinear8 = timeit(lambda: map.trilinear(uv, lod, mipmaps8))
+    t_mapped = timeit(lambda: map.trilinear(uv, lod, texture_assets["mipmaps"]))
+    print(s, "x", s, "pixels, level", round(lod[0], 2), "- Msamples/sec bilinear:", round(samples / t_bilinear / 1e6, 1),
+          "trilinear float32:", round(samples / t_trilinear32 / 1e6, 1), "trilinear uint8:", round(samples / t_trilinear8 / 1e6, 1),
+          "trilinear uint8 memory mapped:", round(samples / t_mapped / 1e6, 1))
+
+# The whole render with the texture read at every pixel
+scene = Scene()
+for filtering in ["bilinear", "trilinear"]:
+    render_time = timeit(lambda: map.render_object_map("nolight", focal, eye, target, up, bg_color, M, N, H, W,
+                    verts, vert_colors, faces, ka, kd, ks, n, light_positions, light_intensities, Ia, uvs, face_uvs, text_map,
+                    scene=scene, sampling="pixel", filtering=filtering))
+    print("render with", filtering, "filtering:", render_time, "sec")
\ No newline at end of file
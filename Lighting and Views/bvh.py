@@ -0,0 +1,206 @@
+import numpy as np
+import transformations as trans
+
+# Bounding volume hierarchy of the triangles of an object, built once and kept in flat arrays (no node objects).
+# Every node has the box of its triangles and the range start:start + count of them in the array "triangles",
+# the two children of an inner node are left and left + 1 and split its range in two, a leaf has left = -1.
+# The queries visit the tree one level at a time for all the nodes (or all the rays) together:
+#   frustum_triangles: the triangles that may be seen from a camera, a node outside the frustum drops all its triangles
+#                      and a node inside it keeps them without visiting its children
+#   pick:              the triangle and the vertex under pixels of a rendered view (a ray through each pixel)
+
+def ranges(starts, counts):
+    # returns: the concatenation of arange(start, start + count) for all the ranges
+    offsets = np.cumsum(counts) - counts
+    return np.arange(np.sum(counts)) - np.repeat(offsets - starts, counts)
+
+def build_bvh(verts, faces, leaf_size=4):
+    # verts: 3 x Nv, the coordinates of the vertices of the object
+    # faces: 3 x NT, the triangles of the object
+    # leaf_size: the maximum number of triangles of a leaf
+    # returns: the hierarchy, a dictionary with the arrays of the K nodes
+    #   "lower", "upper": K x 3, the corners of the box of each node
+    #   "left":           K, the first child of each node (the second is left + 1), -1 for the leaves
+    #   "start", "count": K, the triangles of each node are triangles[start:start + count]
+    #   "triangles":      NT, the triangles in the order of the leaves
+    # The nodes are split in the middle of their triangles sorted along the longest side of the box of their centers,
+    # all the nodes of a level at once
+    corners = verts[:, faces] # 3 x 3 x NT
+    tri_lower = np.min(corners, axis=1).T # NT x 3
+    tri_upper = np.max(corners, axis=1).T
+    centers = (tri_lower + tri_upper) / 2
+    order = np.arange(faces.shape[1])
+
+    nodes = {"lower": [], "upper": [], "left": [], "start": [], "count": []}
+    start, count = np.array([0]), np.array([faces.shape[1]]) # the nodes of the level
+    first = 0 # the index of the first node of the level
+    while len(start):
+        # the boxes of the nodes of the level, their ranges do not overlap (one extra row for a range that ends at NT)
+        bounds = np.stack([start, start + count], axis=1).ravel()
+        nodes["lower"].append(np.minimum.reduceat(np.vstack([tri_lower[order], tri_lower[:1]]), bounds)[::2])
+        nodes["upper"].append(np.maximum.reduceat(np.vstack([tri_upper[order], tri_upper[:1]]), bounds)[::2])
+        nodes["start"].append(start)
+        nodes["count"].append(count)
+
+        inner = count > leaf_size
+        left = np.full(len(start), -1)
+        left[inner] = first + len(start) + 2 * np.arange(np.count_nonzero(inner))
+        nodes["left"].append(left)
+        first += len(start)
+        start, count = start[inner], count[inner]
+        if len(start) == 0:
+            break
+
+        # sort the triangles of every inner node along the longest side of the box of their centers
+        place = ranges(start, count)
+        node = np.repeat(np.arange(len(start)), count)
+        c = centers[order[place]]
+        offsets = np.cumsum(count) - count
+        extent = np.maximum.reduceat(c, offsets) - np.minimum.reduceat(c, offsets)
+        key = c[np.arange(len(c)), np.argmax(extent, axis=1)[node]]
+        order[place] = order[place][np.lexsort((key, node))]
+
+        # the children of the next level
+        half = count // 2
+        start, count = np.stack([start, start + half], axis=1).ravel(), np.stack([half, count - half], axis=1).ravel()
+
+    tree = {name: np.concatenate(value) for name, value in nodes.items()}
+    tree["triangles"] = order
+    return tree
+
+def frustum_planes(focal, eye, lookat, up, M, N, H, W, near=0):
+    # focal, eye, lookat, up, M, N, H, W: the camera of the render (the same as in render.render_object)
+    # near: the depth in front of which the points are kept
+    # returns: the 5 planes of the frustum in the world, normals 5 x 3 and offsets 5 - the points p with normals @ p + offsets >= 0
+    #          are drawn by the rasterizers, the pixels [-N, N) x [-M, M) (the negative ones count from the end of the image)
+    #          and the vertices that are rounded to them, half a pixel around
+    R, t = trans.lookat(eye, up, lookat)
+    # the pixel x of a point of the camera system is N / W * (focal * xc / zc - W / 2), so x >= x0 is xc - (x0 * W / N + W / 2) / focal * zc >= 0
+    x0, x1 = (np.array([-N - 0.5, N - 0.5]) * W / N + W / 2) / focal
+    y0, y1 = (np.array([-M - 0.5, M - 0.5]) * H / M + H / 2) / focal
+    camera = np.array([[1, 0, -x0],
+                       [-1, 0, x1],
+                       [0, 1, -y0],
+                       [0, -1, y1],
+                       [0, 0, 1]])
+    # a point of the world is R @ p + t in the camera system
+    return camera @ R, camera @ np.reshape(t, 3) - np.array([0, 0, 0, 0, near])
+
+def frustum_triangles(tree, focal, eye, lookat, up, M, N, H, W, near=0):
+    # tree: the hierarchy of the object (build_bvh)
+    # focal, eye, lookat, up, M, N, H, W, near: the camera (frustum_planes)
+    # returns: boolean array NT, True for the triangles whose box is not outside the frustum
+    #          (the same triangles as the offscreen and behind tests of transformations.cull_triangles and some more near the edges)
+    normals, offsets = frustum_planes(focal, eye, lookat, up, M, N, H, W, near)
+    positive = normals > 0
+    keep = np.zeros(len(tree["triangles"]), dtype=bool)
+    node = np.array([0])
+    while len(node):
+        lower, upper = tree["lower"][node], tree["upper"][node] # P x 3
+        # the corner of each box which is the farthest on the inner side of each plane and the one the farthest on the outer side
+        far = np.where(positive, upper[:, None], lower[:, None]) # P x 5 x 3
+        close = np.where(positive, lower[:, None], upper[:, None])
+        outside = np.any(np.einsum('pkc,kc->pk', far, normals) + offsets < 0, axis=1)
+        inside = np.all(np.einsum('pkc,kc->pk', close, normals) + offsets >= 0, axis=1)
+        leaf = tree["left"][node] < 0
+        done = ~outside & (inside | leaf) # all the triangles of these nodes are kept
+        keep[tree["triangles"][ranges(tree["start"][node[done]], tree["count"][node[done]])]] = True
+        node = tree["left"][node[~outside & ~done]]
+        node = np.stack([node, node + 1], axis=1).ravel()
+    return keep
+
+def camera_rays(xs, ys, focal, eye, lookat, up, M, N, H, W):
+    # xs, ys: P, the pixel coordinates of the rays
+    # focal, eye, lookat, up, M, N, H, W: the camera of the render
+    # returns: the origin 3 (the eye) and the directions P x 3 of the rays through the pixels,
+    #          the direction has depth 1 so the distance along it is the depth of the point (as in perspective_project)
+    R, t = trans.lookat(eye, up, lookat)
+    # the inverse of rasterize and perspective_project
+    camera = np.stack([(np.asarray(xs) * W / N + W / 2) / focal,
+                       (np.asarray(ys) * H / M + H / 2) / focal,
+                       np.ones(len(xs))], axis=1)
+    return -R.T @ np.reshape(t, 3), camera @ R
+
+def ray_boxes(origin, directions, lower, upper):
+    # returns: the distances where the rays enter and leave the boxes (enter > leave when they miss them)
+    directions = np.where(directions == 0, 1e-300, directions) # a ray parallel to a side is inside or outside its slab everywhere
+    t0 = (lower - origin) / directions
+    t1 = (upper - origin) / directions
+    return np.max(np.minimum(t0, t1), axis=1), np.min(np.maximum(t0, t1), axis=1)
+
+def ray_triangles(origin, directions, v0, v1, v2):
+    # Moller - Trumbore intersection of the rays with the triangles (one triangle for each ray)
+    # returns: the distance of the hits (inf for a miss) and the barycentric coordinates u, v of vertices 1, 2
+    e1, e2 = v1 - v0, v2 - v0
+    p = np.cross(directions, e2)
+    det = np.sum(e1 * p, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inv = 1 / det
+        s = origin - v0
+        u = np.sum(s * p, axis=1) * inv
+        q = np.cross(s, e1)
+        v = np.sum(directions * q, axis=1) * inv
+        distance = np.sum(e2 * q, axis=1) * inv
+    hit = (det != 0) & (u >= 0) & (v >= 0) & (u + v <= 1) & (distance > 0)
+    return np.where(hit, distance, np.inf), u, v
+
+def pick(tree, verts, faces, xs, ys, focal, eye, lookat, up, M, N, H, W, wrap=True, max_rays=1 << 16):
+    # tree: the hierarchy of verts, faces (build_bvh)
+    # verts: 3 x Nv, faces: 3 x NT, the object
+    # xs, ys: P, the pixels (columns and rows of the image)
+    # focal, eye, lookat, up, M, N, H, W: the camera of the rendered view
+    # wrap: if True the pixels are also cast from x - N and y - M, which the rasterizers draw at the same pixel
+    #       (the negative coordinates count from the end of the image) and the nearest hit is kept, as the depth buffer does
+    # max_rays: the number of rays that visit the tree together
+    # returns: tri:     P, the nearest triangle under each pixel, -1 where there is none
+    #          vertex:  P, its vertex nearest to the hit (the largest barycentric coordinate), -1 where there is none
+    #          depth:   P, the depth of the hit, inf where there is none
+    #          weights: P x 3, the barycentric coordinates of the hit
+    xs, ys = np.ravel(xs), np.ravel(ys)
+    if wrap:
+        shifts = [(0, 0), (-N, 0), (0, -M), (-N, -M)]
+        candidates = [pick(tree, verts, faces, xs + dx, ys + dy, focal, eye, lookat, up, M, N, H, W, False, max_rays) for dx, dy in shifts]
+        nearest = np.argmin(np.stack([c[2] for c in candidates]), axis=0)
+        tri, vertex, depth, weights = (np.stack(values)[nearest, np.arange(len(xs))] for values in zip(*candidates))
+        return tri, vertex, depth, weights
+
+    tri = np.full(len(xs), -1)
+    depth = np.full(len(xs), np.inf)
+    weights = np.zeros((len(xs), 3))
+    for chunk in range(0, len(xs), max_rays):
+        origin, directions = camera_rays(xs[chunk:chunk + max_rays], ys[chunk:chunk + max_rays], focal, eye, lookat, up, M, N, H, W)
+        best = np.full(len(directions), np.inf)
+        best_tri = np.full(len(directions), -1)
+        best_uv = np.zeros((len(directions), 2))
+        ray, node = np.arange(len(directions)), np.zeros(len(directions), dtype=int) # the pairs of a ray and a node that it may hit
+        while len(ray):
+            enter, leave = ray_boxes(origin, directions[ray], tree["lower"][node], tree["upper"][node])
+            # the boxes behind the eye and the ones farther than the nearest hit of the ray so far are not visited
+            hit = (enter <= leave) & (leave > 0) & (enter <= best[ray])
+            ray, node = ray[hit], node[hit]
+            leaf = tree["left"][node] < 0
+
+            # every ray against the triangles of its leaves
+            count = tree["count"][node[leaf]]
+            pair_ray = np.repeat(ray[leaf], count)
+            pair_tri = tree["triangles"][ranges(tree["start"][node[leaf]], count)]
+            v0, v1, v2 = (verts[:, faces[k, pair_tri]].T for k in range(3))
+            distance, u, v = ray_triangles(origin, directions[pair_ray], v0, v1, v2)
+            # the nearest hit of every ray (on equal depth the first triangle) replaces its hit so far if it is nearer
+            order = np.lexsort((pair_tri, distance, pair_ray))
+            first = order[np.append(True, pair_ray[order][1:] != pair_ray[order][:-1])] if len(order) else order
+            nearer = distance[first] < best[pair_ray[first]]
+            first = first[nearer]
+            best[pair_ray[first]] = distance[first]
+            best_tri[pair_ray[first]] = pair_tri[first]
+            best_uv[pair_ray[first]] = np.stack([u[first], v[first]], axis=1)
+
+            children = tree["left"][node[~leaf]]
+            ray = np.repeat(ray[~leaf], 2)
+            node = np.stack([children, children + 1], axis=1).ravel()
+        tri[chunk:chunk + max_rays] = best_tri
+        depth[chunk:chunk + max_rays] = best
+        weights[chunk:chunk + max_rays] = np.stack([1 - best_uv[:, 0] - best_uv[:, 1], best_uv[:, 0], best_uv[:, 1]], axis=1)
+    weights[tri < 0] = 0
+    vertex = np.where(tri >= 0, faces[np.argmax(weights, axis=1), np.maximum(tri, 0)], -1)
+    return tri, vertex, depth, weights
\ No newline at end of file
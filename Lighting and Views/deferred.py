@@ -0,0 +1,136 @@
+import numpy as np
+import functions as f
+import lighting as l
+from scene import Scene
+
+# Deferred shading: the geometry pass rasterizes the object once and stores the visible surface of every pixel (the G-buffer),
+# the lighting pass computes the Phong model for all the pixels and all the lights with array operations.
+# The same G-buffer can be lit again with other ka, kd, ks, n or light sources without rasterizing again.
+# For many such variants (a sweep) the terms of every light are kept in buffers and each variant is a linear combination of them.
+
+def geometry_pass(focal, eye, lookat, up, M, N, H, W, verts, vert_colors, faces, scene=None):
+    # focal: number, the distance of the projection from the centre of the camera
+    # eye:   3 x 1, the coordinates of the centre of the camera
+    # lookat:3 x 1, the coordinates of the camera target point
+    # up:    3 x 1, unit up vector of the camera
+    # M, N:  height and width of the image in pixels M x N pixels
+    # H, W:  physical height and width of the camera
+    # verts: 3 x Nv, the coordinates of the vertices of the object
+    # vert_colors: Nv x 3, the RGB color of each vertex of the object
+    # faces: 3 x NT, the triangles of the object
+    # scene: optional Scene, keeps the normals, the projection and the order of the triangles between the calls
+    # returns: the G-buffer, a dictionary with the arrays of the visible surface at each pixel
+    #   "mask":     M x N, True where a triangle covers the pixel
+    #   "depth":    M x N, the depth of the visible fragment
+    #   "normal":   M x N x 3, the interpolated normal vector
+    #   "albedo":   M x N x 3, the interpolated vertex color
+    #   "position": M x N x 3, the point that is lit, the same b_coords that render_object gives to the shaders
+
+    if scene is None:
+        scene = Scene()
+    normals = scene.normals(verts, faces)
+
+    # Project the vertices to pixel coordinates, as render_object does
+    pixel_coords, depth_values = scene.projection(verts, focal, eye, lookat, up, M, N, H, W)
+
+    # Rasterize all the triangles at once and keep the nearest fragment of every pixel
+    # the triangles are given from the nearest to the farthest so that equal depths are resolved as in render_object with zbuffer
+    faces = faces[:, scene.triangle_order(faces, depth_values, True)]
+    vertices_triangle = pixel_coords[:, faces].transpose(2, 1, 0) # NT x 3 x 2
+    tri, ys, xs, weights = f.batch_fragments(vertices_triangle, M, N)
+    zbuf = np.full((M, N), np.inf, dtype=np.float32)
+    tri, ys, xs, weights = f.resolve_fragments(tri, ys, xs, weights, N, depth_values[faces].T, zbuf)
+
+    gbuffer = {
+        "mask": np.zeros((M, N), dtype=bool),
+        "depth": zbuf,
+        "normal": np.zeros((M, N, 3)),
+        "albedo": np.zeros((M, N, 3)),
+        "position": np.zeros((M, N, 3)),
+    }
+    gbuffer["mask"][ys, xs] = True
+    gbuffer["normal"][ys, xs] = np.einsum('pk,ckp->pc', weights, normals[:, faces[:, tri]])
+    gbuffer["albedo"][ys, xs] = np.einsum('pk,kpc->pc', weights, vert_colors[faces[:, tri]])
+    bcoords = np.mean(verts[:, faces], axis=0) # 3 x NT, b_coords of every triangle
+    gbuffer["position"][ys, xs] = bcoords[:, tri].T
+    return gbuffer
+
+def lighting_pass(gbuffer, cam_pos, ka, kd, ks, n, lpos, lint, light_amb, bg_color, dtype=np.float64, out=None):
+    # gbuffer: the G-buffer of geometry_pass
+    # cam_pos: 3 x 1, the coordinates of the camera
+    # ka, kd, ks, n: the ambient, diffuse, specular reflection coefficients and the Phong constant
+    # lpos: N x 3, the positions of the light sources
+    # lint: N x 3, the intensities of the light sources
+    # light_amb: 3 x 1, the ambient light intensity
+    # bg_color: 3 x 1, the RGB color of the background
+    # dtype: the type of the image - np.float64, np.float32 or np.uint8 for a BGR image with values 0-255 (functions.framebuffer)
+    # out: optional M x N x 3 array which gets the image, to reuse the memory of a previous render
+    # returns: M x N x 3, the image lit with the Phong model (the same model as lighting.light)
+    mask = gbuffer["mask"]
+    img = f.framebuffer(mask.shape, bg_color, dtype, out)
+
+    # All the covered pixels are lit with one call
+    point = gbuffer["position"][mask] # P x 3
+    normal = gbuffer["normal"][mask]
+    vcolor = gbuffer["albedo"][mask]
+    img[mask] = l.light_batch(point, normal, vcolor, cam_pos, ka * light_amb, kd, ks, n, lpos, lint)
+    return f.finish_framebuffer(img, dtype, out)
+
+def render_object_deferred(focal, eye, lookat, up, bg_color, M, N, H, W,
+                           verts, vert_colors, faces, ka, kd, ks, n, lpos, lint, light_amb, scene=None, dtype=np.float64, out=None):
+    # The same arguments as render.render_object without the shader, the object is shaded per pixel (Phong)
+    # with one geometry pass and one lighting pass
+    gbuffer = geometry_pass(focal, eye, lookat, up, M, N, H, W, verts, vert_colors, faces, scene)
+    return lighting_pass(gbuffer, eye, ka, kd, ks, n, lpos, lint, light_amb, bg_color, dtype, out)
+
+def sweep_buffers(gbuffer, cam_pos, lpos, lint, light_amb):
+    # gbuffer: the G-buffer of geometry_pass
+    # cam_pos, lpos, lint, light_amb: the same as in lighting_pass
+    # returns: the contribution buffers of the covered pixels (P of them), a dictionary with
+    #   "mask":       M x N, the covered pixels
+    #   "ambient":    3 x 1, the ambient light (the ambient component is ka times it)
+    #   "diffuse":    N x P x 3, the diffuse component of each light for kd = 1
+    #   "reflection": N x P, the cosine between the view and the reflection direction for each light
+    #   "specular":   N x P x 3, the specular component of each light for ks = 1 and n = 0
+    #                 (for other n it is multiplied by reflection ** n)
+    mask = gbuffer["mask"]
+    point = gbuffer["position"][mask] # P x 3
+    normal = gbuffer["normal"][mask]
+    vcolor = gbuffer["albedo"][mask]
+    LN, VR, lint = l.light_terms(point, normal, cam_pos, lpos, lint)
+    color = lint * vcolor[:, np.newaxis] # P x N x 3, the intensity of each light times the color
+    return {
+        "mask": mask,
+        "ambient": np.asarray(light_amb),
+        "diffuse": (np.maximum(LN, 0)[..., np.newaxis] * color).transpose(1, 0, 2),
+        "reflection": VR.T,
+        "specular": color.transpose(1, 0, 2),
+    }
+
+def combine_buffers(buffers, ka, kd, ks, n, bg_color, lights=None, dtype=np.float64, out=None):
+    # buffers: the contribution buffers of sweep_buffers
+    # ka, kd, ks, n: the ambient, diffuse, specular reflection coefficients and the Phong constant
+    # bg_color: 3 x 1, the RGB color of the background
+    # lights: the indices of the light sources that are on, None for all of them
+    # dtype: the type of the image - np.float64, np.float32 or np.uint8 for a BGR image with values 0-255 (functions.framebuffer)
+    # out: optional M x N x 3 array which gets the image, to reuse the memory of a previous render
+    # returns: M x N x 3, the same image as lighting_pass with these coefficients and the light sources lpos[lights], lint[lights]
+    mask = buffers["mask"]
+    img = f.framebuffer(mask.shape, bg_color, dtype, out)
+    if lights is None:
+        lights = slice(None)
+    diffuse = buffers["diffuse"][lights]
+    specular = buffers["reflection"][lights][..., np.newaxis] ** n * buffers["specular"][lights]
+    img[mask] = np.clip(ka * buffers["ambient"] + kd * np.sum(diffuse, axis=0) + ks * np.sum(specular, axis=0), 0, 1)
+    return f.finish_framebuffer(img, dtype, out)
+
+def render_sweep(focal, eye, lookat, up, bg_color, M, N, H, W,
+                 verts, vert_colors, faces, lpos, lint, light_amb, variants, scene=None, dtype=np.float64):
+    # The same arguments as render_object_deferred without ka, kd, ks, n
+    # variants: list of (ka, kd, ks, n, lights) - lights are the indices of the light sources that are on, None for all
+    # dtype: the type of the images (functions.framebuffer)
+    # returns: list of M x N x 3, one image for each variant
+    # The object is rasterized once, the terms of the lights are computed once and every variant only combines them
+    gbuffer = geometry_pass(focal, eye, lookat, up, M, N, H, W, verts, vert_colors, faces, scene)
+    buffers = sweep_buffers(gbuffer, eye, lpos, lint, light_amb)
+    return [combine_buffers(buffers, ka, kd, ks, n, bg_color, lights, dtype) for ka, kd, ks, n, lights in variants]
\ No newline at end of file
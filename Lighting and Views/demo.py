@@ -1,11 +1,11 @@
-import numpy as np
-import matplotlib.pyplot as plt
-import cv2
-import lighting as l
+import assets
 import render as r
+from scene import Scene
+import sink
 import time
 
-data_dict = np.load('h3.npy', allow_pickle=True).item()
+# The arrays are memory mapped from h3.assets (written from h3.npy the first time)
+data_dict = assets.load('h3.npy')
 
 #Extract the data
 verts = data_dict['verts']
@@ -30,71 +30,82 @@ H = data_dict['H']
 bg_color = data_dict['bg_color'].T
 focal = data_dict['focal']
 
-start_time = time.time()
+# All the renders are of the same object from the same camera, the normals, the projection
+# and the order of the triangles are computed once and only the shading is done again
+scene = Scene()
 
-# GOURAUD
-# ONLY AMBIENT LIGHT
-# kd = 0 and ks = 0
+# The images are flipped vertically (img[::-1]) and written by the sink while the next one is rendered
+def gouraud_frames():
+    start_time = time.time()
 
-img = r.render_object("gouraud", focal, eye, target, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, ka, 0, 0, n, light_positions, light_intensities, Ia)
-plt.imsave('0.jpg', np.array(img[::-1]))
+    # GOURAUD
+    # ONLY AMBIENT LIGHT
+    # kd = 0 and ks = 0
+    img = r.render_object("gouraud", focal, eye, target, up, bg_color, M, N, H, W,
+                    verts, vert_colors, faces, ka, 0, 0, n, light_positions, light_intensities, Ia, scene=scene)
+    yield img[::-1]
+
+    # ONLY DIFFUSE LIGHT
+    # ka = 0 and ks = 0
+    img = r.render_object("gouraud", focal, eye, target, up, bg_color, M, N, H, W,
+                    verts, vert_colors, faces, 0, kd, 0, n, light_positions, light_intensities, Ia, scene=scene)
+    yield img[::-1]
 
-# ONLY DIFFUSE LIGHT
-# ka = 0 and ks = 0
-img = r.render_object("gouraud", focal, eye, target, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, 0, kd, 0, n, light_positions, light_intensities, Ia)
-plt.imsave('1.jpg', np.array(img[::-1]))
+    # ONLY SPECULAR LIGHT
+    # ka = 0 and kd = 0
+    img = r.render_object("gouraud", focal, eye, target, up, bg_color, M, N, H, W,
+                    verts, vert_colors, faces, 0, 0, ks, n, light_positions, light_intensities, Ia, scene=scene)
+    yield img[::-1]
+
+    # ALL LIGHTS
+    img = r.render_object("gouraud", focal, eye, target, up, bg_color, M, N, H, W,
+                    verts, vert_colors, faces, ka, kd, ks, n, light_positions, light_intensities, Ia, scene=scene)
+    yield img[::-1]
 
-# ONLY SPECULAR LIGHT
-# ka = 0 and kd = 0
-img = r.render_object("gouraud", focal, eye, target, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, 0, 0, ks, n, light_positions, light_intensities, Ia)
-plt.imsave('2.jpg', np.array(img[::-1]))
+    print("Objects rendered in", time.time() - start_time, "sec")
 
-# ALL LIGHTS
-img = r.render_object("gouraud", focal, eye, target, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, ka, kd, ks, n, light_positions, light_intensities, Ia)
-plt.imsave('3.jpg', np.array(img[::-1]))
+def phong_frames(stats):
+    start_time = time.time()
 
-print("Objects rendered in", time.time() - start_time, "sec")
-start_time = time.time()
+    # PHONG
+    # With the depth buffer the triangles are drawn from the nearest to the farthest and only the visible fragments are lit
+    # ONLY AMBIENT LIGHT
+    # kd = 0 and ks = 0
+    img = r.render_object("phong", focal, eye, target, up, bg_color, M, N, H, W,
+                    verts, vert_colors, faces, ka, 0, 0, n, light_positions, light_intensities, Ia, zbuffer=True, stats=stats, scene=scene)
+    yield img[::-1]
 
-# PHONG
-# ONLY AMBIENT LIGHT
-# kd = 0 and ks = 0
-img = r.render_object("phong", focal, eye, target, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, ka, 0, 0, n, light_positions, light_intensities, Ia)
-plt.imsave('4.jpg', np.array(img[::-1]))
+    # ONLY DIFFUSE LIGHT
+    # ka = 0 and ks = 0
+    img = r.render_object("phong", focal, eye, target, up, bg_color, M, N, H, W,
+                    verts, vert_colors, faces, 0, kd, 0, n, light_positions, light_intensities, Ia, zbuffer=True, stats=stats, scene=scene)
+    yield img[::-1]
 
-# ONLY DIFFUSE LIGHT
-# ka = 0 and ks = 0
-img = r.render_object("phong", focal, eye, target, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, 0, kd, 0, n, light_positions, light_intensities, Ia)
-plt.imsave('5.jpg', np.array(img[::-1]))
+    # ONLY SPECULAR LIGHT
+    # ka = 0 and kd = 0
+    img = r.render_object("phong", focal, eye, target, up, bg_color, M, N, H, W,
+                    verts, vert_colors, faces, 0, 0, ks, n, light_positions, light_intensities, Ia, zbuffer=True, stats=stats, scene=scene)
+    yield img[::-1]
 
-# ONLY SPECULAR LIGHT
-# ka = 0 and kd = 0
+    # ALL LIGHTS
+    img = r.render_object("phong", focal, eye, target, up, bg_color, M, N, H, W,
+                    verts, vert_colors, faces, ka, kd, ks, n, light_positions, light_intensities, Ia, zbuffer=True, stats=stats, scene=scene)
+    yield img[::-1]
 
-img = r.render_object("phong", focal, eye, target, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, 0, 0, ks, n, light_positions, light_intensities, Ia)
-plt.imsave('6.jpg', np.array(img[::-1]))
+    print("Phong objects rendered in", time.time() - start_time, "sec")
 
-# ALL LIGHTS
-img = r.render_object("phong", focal, eye, target, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, ka, kd, ks, n, light_positions, light_intensities, Ia)
-plt.imsave('7.jpg', np.array(img[::-1]))
-print("Phong objects rendered in", time.time() - start_time, "sec")
+sink.write_frames(gouraud_frames(), '%d.jpg') # 0.jpg ... 3.jpg
+stats = {}
+sink.write_frames(phong_frames(stats), ['4.jpg', '5.jpg', '6.jpg', '7.jpg'])
+print("Light evaluations:", stats["light_evals"], "saved by the depth test:", stats["light_saved"])
 
 
 # GOURAUD for every light source
-for i in range(len(light_positions)):
-    img = r.render_object("gouraud", focal, eye, target, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, ka, kd, ks, n, light_positions[i], light_intensities[i], Ia)
-    plt.imsave('g_light' + str(i) + '.jpg', np.array(img[::-1]))
+sink.write_frames((r.render_object("gouraud", focal, eye, target, up, bg_color, M, N, H, W,
+                    verts, vert_colors, faces, ka, kd, ks, n, light_positions[i], light_intensities[i], Ia, scene=scene)[::-1]
+                   for i in range(len(light_positions))), 'g_light%d.jpg')
 
 # PHONG for every light source
-for i in range(len(light_positions)):
-    img = r.render_object("phong", focal, eye, target, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, ka, kd, ks, n, light_positions[i], light_intensities[i], Ia)
-    plt.imsave('p_light' + str(i) + '.jpg', np.array(img[::-1]))
\ No newline at end of file
+sink.write_frames((r.render_object("phong", focal, eye, target, up, bg_color, M, N, H, W,
+                    verts, vert_colors, faces, ka, kd, ks, n, light_positions[i], light_intensities[i], Ia, scene=scene)[::-1]
+                   for i in range(len(light_positions))), 'p_light%d.jpg')
\ No newline at end of file
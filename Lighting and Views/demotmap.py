@@ -1,9 +1,10 @@
-import numpy as np
-import matplotlib.pyplot as plt
-import cv2
+import assets
 import tmap as map
+from scene import Scene
+import sink
 
-data_dict = np.load('h3.npy', allow_pickle=True).item()
+# The arrays are memory mapped from h3.assets (written from h3.npy the first time)
+data_dict = assets.load('h3.npy')
 
 #Extract the data
 verts = data_dict['verts']
@@ -28,24 +29,35 @@ H = data_dict['H']
 bg_color = data_dict['bg_color'].T
 focal = data_dict['focal']
 
-# The image is now a MxNx3 numpy array but the color values are between 0 and 255
-text_map = cv2.imread('cat_diff.png')
-text_map = cv2.cvtColor(text_map, cv2.COLOR_BGR2RGB)
-# The image is now a MxNx3 numpy array but the values are between 0 and 255
-# Normalize the values to be between 0 and 1
-text_map = text_map / 255.0
-
-# Image with Gouraud shading and lighting
-img = map.render_object_map("gouraud", focal, eye, target, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, ka, kd, ks, n, light_positions, light_intensities, Ia, uvs, face_uvs, text_map)
-plt.imsave('mapGouraudLight.jpg', np.array(img[::-1]))
-
-# Image with Phong shading and lighting
-img = map.render_object_map("phong", focal, eye, target, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, ka, kd, ks, n, light_positions, light_intensities, Ia, uvs, face_uvs, text_map)
-plt.imsave('mapPhongLight.jpg', np.array(img[::-1]))
-
-# Image with no lighting and gouard shading
-img = map.render_object_map("nolight", focal, eye, target, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, ka, kd, ks, n, light_positions, light_intensities, Ia, uvs, face_uvs, text_map)
-plt.imsave('mapNoLight.jpg', np.array(img[::-1]))
\ No newline at end of file
+# The image is decoded once into cat_diff.png.assets and memory mapped from there
+# The texture is a MxNx3 uint8 array (values between 0 and 255), the sampling divides the read values by 255
+text_map = assets.load_texture('cat_diff.png')["texture"]
+
+# The three renders share the normals, the projection and the colors of the texture at the vertices
+scene = Scene()
+
+# The images are flipped vertically (img[::-1]) and written by the sink while the next one is rendered
+def map_frames():
+    # Image with Gouraud shading and lighting
+    img = map.render_object_map("gouraud", focal, eye, target, up, bg_color, M, N, H, W,
+                    verts, vert_colors, faces, ka, kd, ks, n, light_positions, light_intensities, Ia, uvs, face_uvs, text_map, scene=scene)
+    yield img[::-1]
+
+    # Image with Phong shading and lighting
+    img = map.render_object_map("phong", focal, eye, target, up, bg_color, M, N, H, W,
+                    verts, vert_colors, faces, ka, kd, ks, n, light_positions, light_intensities, Ia, uvs, face_uvs, text_map, scene=scene)
+    yield img[::-1]
+
+    # Image with no lighting and gouard shading
+    img = map.render_object_map("nolight", focal, eye, target, up, bg_color, M, N, H, W,
+                    verts, vert_colors, faces, ka, kd, ks, n, light_positions, light_intensities, Ia, uvs, face_uvs, text_map, scene=scene)
+    yield img[::-1]
+
+    # The same renders with the texture read at every pixel (perspective correct) instead of the vertices
+    for shader in ["gouraud", "phong", "nolight"]:
+        img = map.render_object_map(shader, focal, eye, target, up, bg_color, M, N, H, W,
+                    verts, vert_colors, faces, ka, kd, ks, n, light_positions, light_intensities, Ia, uvs, face_uvs, text_map, scene=scene, sampling="pixel")
+        yield img[::-1]
+
+sink.write_frames(map_frames(), ['mapGouraudLight.jpg', 'mapPhongLight.jpg', 'mapNoLight.jpg',
+                                 'mapGouraudPixel.jpg', 'mapPhongPixel.jpg', 'mapNolightPixel.jpg'])
\ No newline at end of file
@@ -1,4 +1,5 @@
 import numpy as np
+from multiprocessing import shared_memory
 # Grid
 M=512
 N=512
@@ -20,6 +21,114 @@ def vector_interp(p1, p2, V1, V2, coord,dim):
     V = V1 * (1-alpha) + V2 * alpha
     return V
 
+# VECTOR INTERPOLATION OVER A WHOLE SPAN
+def vector_interp_span(p1, p2, V1, V2, coords, dim):
+    # Same as vector_interp but coords is an array of coordinates (e.g. all the x of a scan line)
+    # returns a len(coords) x len(V1) array, the same values that vector_interp returns for each coordinate
+    if np.allclose(p1, p2):
+        return np.tile(np.mean([V1, V2], axis=0), (len(coords), 1))
+    alpha = (coords - p1[dim-1]) / (p2[dim-1] - p1[dim-1])
+    alpha = alpha[:, np.newaxis] # one row for each coordinate, broadcast over the vector components
+    V = V1 * (1-alpha) + V2 * alpha
+    return V
+
+# The pixels of the scan line y between x_left and x_right (included)
+def span_index(y, x_left, x_right):
+    # A slice when the span is inside the canvas, otherwise the explicit x values so that
+    # negative x are handled in the same way as the pixel by pixel filling (img[y, x])
+    if x_left >= 0:
+        return y, slice(x_left, x_right + 1)
+    return y, np.arange(x_left, x_right + 1)
+
+# SCISSOR
+# The pixels that the rasterizers can draw in an M x N image are the rows -M..M-1 and the columns -N..N-1,
+# the negative ones count from the end of the image as they do with img[y, x] (the same pixels that batch_fragments keeps).
+# The scan lines and the spans are clamped to them, so a triangle that is mostly outside the image
+# only costs its visible part and never indexes outside of the image.
+# A window is a smaller rectangle of these pixels (y0, y1, x0, x1 - the rows y0..y1-1 and the columns x0..x1-1),
+# then only its pixels are drawn (e.g. the tiles of tiles.render_tiled, see window_parts).
+def drawable(shape, window=None):
+    # shape is the (M, N) of the image, window an optional rectangle of its pixels
+    # returns y0, y1, x0, x1 the pixels that can be drawn, the window or the whole image
+    if window is None:
+        return -shape[0], shape[0], -shape[1], shape[1]
+    return window
+
+def scissor_rows(img, ymin, ymax, window=None):
+    # returns the scan lines between ymin and ymax (included) that can be drawn
+    y0, y1, _, _ = drawable(img.shape, window)
+    return range(max(ymin, y0), min(ymax, y1 - 1) + 1)
+
+def scissor_span(img, x_left, x_right, window=None):
+    # returns x_left, x_right clamped to the columns that can be drawn (x_right < x_left if none of them can)
+    _, _, x0, x1 = drawable(img.shape, window)
+    return max(x_left, x0), min(x_right, x1 - 1)
+
+def window_view(img, window=None):
+    # returns the pixels of img in window as a view of img (a window of negative coordinates is the same pixels from the end
+    # of the image), all of img without a window
+    if window is None:
+        return img
+    y0, y1, x0, x1 = window
+    if y0 < 0:
+        y0, y1 = y0 + img.shape[0], y1 + img.shape[0]
+    if x0 < 0:
+        x0, x1 = x0 + img.shape[1], x1 + img.shape[1]
+    return img[y0:y1, x0:x1]
+
+def window_parts(window, shape):
+    # window is y0, y1, x0, x1 a rectangle of the image (0 <= y0 < y1 <= M, 0 <= x0 < x1 <= N), shape the (M, N) of the image
+    # returns the windows of the pixel coordinates that land in it: the rectangle itself and its copies one image up and left
+    # (the negative coordinates count from the end of the image), in the order of the scan lines, so a triangle that is
+    # drawn in each of them in this order gives the rectangle the same pixels as the whole image - [None] for no window
+    if window is None:
+        return [None]
+    y0, y1, x0, x1 = window
+    return [(ya + y0, ya + y1, xa + x0, xa + x1) for ya in (-shape[0], 0) for xa in (-shape[1], 0)]
+
+def triangle_windows(vertices, windows):
+    # vertices are the coordinates of the vertices of a triangle - 3x2 array, windows are the windows of window_parts
+    # returns the windows that the bounding box of the triangle meets (one pixel larger, the scan lines truncate the coordinates)
+    if windows == [None]:
+        return windows
+    (xmin, ymin), (xmax, ymax) = np.min(vertices, axis=0), np.max(vertices, axis=0)
+    return [w for w in windows if ymax >= w[0] - 1 and ymin < w[1] + 1 and xmax >= w[2] - 1 and xmin < w[3] + 1]
+
+# ALL THE SCAN LINES OF A TRIANGLE
+def scan_spans(img, ymin_ymax_array, slope, b, ymin, ymax, window=None):
+    # ymin_ymax_array, slope, b, ymin, ymax are the variables of the triangle from f_triangle
+    # window is the optional rectangle of the pixels that are drawn (drawable)
+    # Finds the active edges and the span of every scan line of the triangle at once, with the same rules and the same
+    # arithmetic as the loop of f_shading (so the same pixels), instead of one scan line at a time in python
+    # returns: ys the scan lines inside the image - 1D array
+    #          edges the two active edges of each scan line, in the order of the loop - Rx2 array
+    #          x_limits the x of the active limit points on these edges - Rx2 array
+    #          x_left, x_right the span of each scan line clamped to the image (scissor_span) - 1D arrays
+    #          or None if some scan line does not have two active edges (a horizontal line), the loop handles these triangles
+    rows = scissor_rows(img, ymin, ymax, window)
+    ys = np.arange(rows.start, rows.stop)
+    y = ys[:, np.newaxis]
+    low, high = ymin_ymax_array[:, 0], ymin_ymax_array[:, 1]
+    # the edges between the two y values of the scan line and on the last scan line the edges that end there (not a horizontal one)
+    active = (low <= y) & (high > y) | (y == ymax) & (high == y) & (low != y)
+    if ymin == ymax or np.any(np.count_nonzero(active, axis=1) != 2):
+        return None
+    edges = np.nonzero(active)[1].reshape(-1, 2)
+    x_limits = np.where(np.isnan(slope[edges]), b[edges], (y - b[edges]) / slope[edges]) # x = b for the vertical edges, else x = (y - b) / slope
+    x_sorted = np.sort(x_limits, axis=1)
+    _, _, x0, x1 = drawable(img.shape, window)
+    x_left = np.maximum(np.ceil(np.round(x_sorted[:, 0], decimals=13)).astype(int), x0)
+    x_right = np.minimum(np.floor(np.round(x_sorted[:, 1], decimals=13)).astype(int), x1 - 1)
+    return ys, edges, x_limits, x_left, x_right
+
+def span_pixels(x_left, x_right):
+    # x_left, x_right are the spans of some scan lines - 1D arrays
+    # returns: rows the index of the scan line of each pixel and xs its x, the pixels of all the spans in order - 1D arrays
+    lengths = np.maximum(x_right - x_left + 1, 0)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    xs = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths - x_left, lengths)
+    return rows, xs
+
 # Function which calculates some useful variables for the definition triangle 
 def f_triangle(vertices):
     # vertices are the coordinates of the vertices of the triangle - 3x2 array
@@ -54,18 +163,28 @@ def f_triangle(vertices):
     return xmin_xmax_array, ymin_ymax_array, slope, b, ymin, ymax
 
 # FLAT SHADING
-def f_shading(img, vertices, vcolors):
+def f_shading(img, vertices, vcolors, span=True, window=None):
     # img is the image to be shaded with likely preexisting triangles - MxNx3 
     # vertices are the coordinates of the vertices of a triangle - 3x2 array
     # vcolors are the colors at these vertices at rgb values - 3x3 array
+    # span: if True every scan line is filled with one slice assignment, else pixel by pixel (legacy)
+    # window: optional rectangle of the pixels that are drawn (drawable)
     
     # Calculate average color
     avg_color = np.mean(vcolors, axis=0)
     # Calculate the variables needed for the triangle definition
     xmin_xmax_array, ymin_ymax_array, slope, b, ymin, ymax = f_triangle(vertices)
 
-    # Start the shading part using the scan lines
-    for y in range(ymin, ymax +1, 1): # ymax + 1 to include the last scan line
+    # Span mode: all the spans of the triangle are found and shaded at once
+    spans = scan_spans(img, ymin_ymax_array, slope, b, ymin, ymax, window) if span else None
+    if spans is not None:
+        ys, _, _, x_left, x_right = spans
+        rows, xs = span_pixels(x_left, x_right)
+        img[ys[rows], xs] = avg_color
+        return img
+
+    # Start the shading part using the scan lines (only the ones inside the image)
+    for y in scissor_rows(img, ymin, ymax, window): # ymax is included
         #INITIALIZATION
         active_edges = [] # clear the previous active edges from the previous scan line 
         active_limit_points = np.zeros((2,2)) # clear the previous active limit points
@@ -97,28 +216,57 @@ def f_shading(img, vertices, vcolors):
 
         sorted_active_limit_points = sorted(active_limit_points, key=lambda x: x[0]) # sort the active limit points by x in ascending order
 
-        for x in range(np.ceil(np.round(sorted_active_limit_points[0][0], decimals=13)).astype(int), np.floor(np.round(sorted_active_limit_points[1][0], decimals=13)).astype(int) + 1, 1): # for every pixel between the two active limit points
-            # since i want to include only the pixels that they are inside the triangle i use the np.ceil and np.floor functions
-            # also i use the np.round function to avoid the floating point errors
-            img[y, x] = avg_color # shade the pixel with the average color of the triangle
+        # since i want to include only the pixels that they are inside the triangle i use the np.ceil and np.floor functions
+        # also i use the np.round function to avoid the floating point errors
+        x_left = np.ceil(np.round(sorted_active_limit_points[0][0], decimals=13)).astype(int)
+        x_right = np.floor(np.round(sorted_active_limit_points[1][0], decimals=13)).astype(int)
+        x_left, x_right = scissor_span(img, x_left, x_right, window)
+        if span:
+            if x_left <= x_right:
+                img[span_index(y, x_left, x_right)] = avg_color # shade the whole span with the average color of the triangle
+        else:
+            for x in range(x_left, x_right + 1, 1): # for every pixel between the two active limit points
+                img[y, x] = avg_color # shade the pixel with the average color of the triangle
     return img # return the updated image
 
 
 # GOURAUD SHADING
-def gouraud_shading(img, vertices, vcolors):
+def gouraud_shading(img, vertices, vcolors, span=True, window=None):
     # img is the image to be shaded with likely preexisting triangles - MxNx3 
     # vertices are the coordinates of the vertices of a triangle - 3x2 array
     # vcolors are the colors at these vertices at rgb values - 3x3 array
+    # span: if True every scan line is filled with one slice assignment, else pixel by pixel (legacy)
+    # window: optional rectangle of the pixels that are drawn (drawable)
 
     # Calculate the variables needed for the triangle definition
     xmin_xmax_array, ymin_ymax_array, slope, b, ymin, ymax = f_triangle(vertices)
+    # Span mode: all the spans of the triangle at once (None for points and horizontal lines)
+    spans = scan_spans(img, ymin_ymax_array, slope, b, ymin, ymax, window) if span else None
 
     # Case: the triangle is a point
     if ymin == ymax and int(np.min(xmin_xmax_array)) == int(np.max(xmin_xmax_array)):
-        img[int(vertices[0][1]), int(vertices[0][0])] = np.mean(vcolors, axis=0) # if the triangle is a point then the shading is the same as the flat shading
+        y, x = int(vertices[0][1]), int(vertices[0][0])
+        y0, y1, x0, x1 = drawable(img.shape, window)
+        if y0 <= y < y1 and x0 <= x < x1: # the point is drawn only if it is inside the image
+            img[y, x] = np.mean(vcolors, axis=0) # if the triangle is a point then the shading is the same as the flat shading
+    elif spans is not None:
+        ys, edges, x_limits, x_left, x_right = spans
+        # The colors at the active limit points, interpolated along y on the active edges (vector_interp for every scan line)
+        start, end = vertices[edges], vertices[(edges + 1) % 3] # Rx2x2
+        alpha = ((ys[:, np.newaxis] - start[..., 1]) / (end[..., 1] - start[..., 1]))[..., np.newaxis]
+        color_alp = vcolors[edges] * (1 - alpha) + vcolors[(edges + 1) % 3] * alpha # Rx2x3
+        close = np.all(np.abs(start - end) <= 1e-8 + 1e-5 * np.abs(end), axis=-1) # np.allclose: vector_interp gives the mean
+        color_alp = np.where(close[..., np.newaxis], (vcolors[edges] + vcolors[(edges + 1) % 3]) / 2, color_alp)
+        # The colors of the pixels, interpolated along x between the active limit points (vector_interp_span for every span)
+        rows, xs = span_pixels(x_left, x_right)
+        x0, x1 = x_limits[rows, 0], x_limits[rows, 1]
+        c0, c1 = color_alp[rows, 0], color_alp[rows, 1]
+        same = np.abs(x0 - x1) <= 1e-8 + 1e-5 * np.abs(x1) # the limit points are the same point, vector_interp_span gives the mean
+        alpha = ((xs - x0) / np.where(same, 1, x1 - x0))[:, np.newaxis]
+        img[ys[rows], xs] = np.where(same[:, np.newaxis], (c0 + c1) / 2, c0 * (1 - alpha) + c1 * alpha)
     else:
-        # Start the shading part using the scan lines
-        for y in range(ymin, ymax + 1, 1):
+        # Start the shading part using the scan lines (only the ones inside the image)
+        for y in scissor_rows(img, ymin, ymax, window):
             # Case: the triangle is a horizontal line (y[0] = y[1] = y[2])
             if ymax == ymin:
                 sorted_indices_asc = np.argsort(vertices[:, 0]) # sort the vertices by x in ascending order and "return" the indices of the sorted array 
@@ -127,21 +275,38 @@ def gouraud_shading(img, vertices, vcolors):
                 
                 if sorted_vertices[0][0] == sorted_vertices[1][0] and sorted_vcolors[0][0] != sorted_vcolors[1][0]:
                     concatenated_array = np.concatenate([sorted_vcolors[0][np.newaxis, :], sorted_vcolors[1][np.newaxis, :]], axis=0) 
-                    for x in range (int(sorted_vertices[0][0]), int(sorted_vertices[2][0]) + 1, 1):
-                        img[y, x] = vector_interp(sorted_vertices[0], sorted_vertices[2], np.mean(concatenated_array, axis=0), sorted_vcolors[2], x, 1)
+                    x_left, x_right = scissor_span(img, int(sorted_vertices[0][0]), int(sorted_vertices[2][0]), window)
+                    if span:
+                        x_span = np.arange(x_left, x_right + 1)
+                        if len(x_span):
+                            img[span_index(y, x_left, x_right)] = vector_interp_span(sorted_vertices[0], sorted_vertices[2], np.mean(concatenated_array, axis=0), sorted_vcolors[2], x_span, 1)
+                    else:
+                        for x in range (x_left, x_right + 1, 1):
+                            img[y, x] = vector_interp(sorted_vertices[0], sorted_vertices[2], np.mean(concatenated_array, axis=0), sorted_vcolors[2], x, 1)
                 
                 elif sorted_vertices[1][0] == sorted_vertices[2][0] and sorted_vcolors[1][0] != sorted_vcolors[2][0]:
                     concatenated_array = np.concatenate([sorted_vcolors[1][np.newaxis, :], sorted_vcolors[2][np.newaxis, :]], axis=0)
-                    for x in range (int(sorted_vertices[0][0]), int(sorted_vertices[2][0]) + 1, 1):
-                        img[y, x] = vector_interp(sorted_vertices[0], sorted_vertices[2], sorted_vcolors[0], np.mean(concatenated_array, axis=0), x, 1)
+                    x_left, x_right = scissor_span(img, int(sorted_vertices[0][0]), int(sorted_vertices[2][0]), window)
+                    if span:
+                        x_span = np.arange(x_left, x_right + 1)
+                        if len(x_span):
+                            img[span_index(y, x_left, x_right)] = vector_interp_span(sorted_vertices[0], sorted_vertices[2], sorted_vcolors[0], np.mean(concatenated_array, axis=0), x_span, 1)
+                    else:
+                        for x in range (x_left, x_right + 1, 1):
+                            img[y, x] = vector_interp(sorted_vertices[0], sorted_vertices[2], sorted_vcolors[0], np.mean(concatenated_array, axis=0), x, 1)
                 
                 else:
-                    # shade the pixels between the first two vertices
-                    for x in range (int(sorted_vertices[0][0]), int(sorted_vertices[1][0]) + 1, 1):
-                        img[y, x] = vector_interp(sorted_vertices[0], sorted_vertices[1], sorted_vcolors[0], sorted_vcolors[1], x, 1)
-                    # shade the pixels between the second and the third vertex
-                    for x in range (int(sorted_vertices[1][0]), int(sorted_vertices[2][0]) + 1, 1):
-                        img[y, x] = vector_interp(sorted_vertices[1], sorted_vertices[2], sorted_vcolors[1], sorted_vcolors[2], x, 1)
+                    for j in range(2):
+                        # j = 0: shade the pixels between the first two vertices
+                        # j = 1: shade the pixels between the second and the third vertex
+                        x_left, x_right = scissor_span(img, int(sorted_vertices[j][0]), int(sorted_vertices[j+1][0]), window)
+                        if span:
+                            x_span = np.arange(x_left, x_right + 1)
+                            if len(x_span):
+                                img[span_index(y, x_left, x_right)] = vector_interp_span(sorted_vertices[j], sorted_vertices[j+1], sorted_vcolors[j], sorted_vcolors[j+1], x_span, 1)
+                        else:
+                            for x in range (x_left, x_right + 1, 1):
+                                img[y, x] = vector_interp(sorted_vertices[j], sorted_vertices[j+1], sorted_vcolors[j], sorted_vcolors[j+1], x, 1)
             else:
                 # General Case
                 #INITIALIZATION
@@ -175,14 +340,347 @@ def gouraud_shading(img, vertices, vcolors):
 
                 sorted_active_limit_points = sorted(active_limit_points, key=lambda x: x[0]) # sort the active limit points by x in ascending order
         
-                for x in range(np.ceil(np.round(sorted_active_limit_points[0][0], decimals=13)).astype(int), np.floor(np.round(sorted_active_limit_points[1][0], decimals=13)).astype(int) + 1, 1): # for every pixel in the scan line
-                    img[y, x] = vector_interp(active_limit_points[0], active_limit_points[1], color_alp[0], color_alp[1], x, 1) # 1D because the scan line is horizontal
+                x_left = np.ceil(np.round(sorted_active_limit_points[0][0], decimals=13)).astype(int)
+                x_right = np.floor(np.round(sorted_active_limit_points[1][0], decimals=13)).astype(int)
+                x_left, x_right = scissor_span(img, x_left, x_right, window)
+                if span:
+                    if x_left <= x_right:
+                        # the colors of the whole span at once - 1D because the scan line is horizontal
+                        x_span = np.arange(x_left, x_right + 1)
+                        img[span_index(y, x_left, x_right)] = vector_interp_span(active_limit_points[0], active_limit_points[1], color_alp[0], color_alp[1], x_span, 1)
+                else:
+                    for x in range(x_left, x_right + 1, 1): # for every pixel in the scan line
+                        img[y, x] = vector_interp(active_limit_points[0], active_limit_points[1], color_alp[0], color_alp[1], x, 1) # 1D because the scan line is horizontal
     
-    return np.clip(img, 0, 1) # return the updated image
+    view = window_view(img, window) # only the pixels of the window can have changed
+    np.clip(view, 0, 1, out=view)
+    return img # return the updated image
+
+
+# EDGE FUNCTION RASTERIZATION
+def edge_function(a, b, px, py):
+    # The edge function of the edge a -> b evaluated at the points (px, py)
+    # it is zero on the line of the edge and its sign shows on which side of the edge each point lies
+    # a, b can also be stacks of points (...x2 arrays) that broadcast with px, py
+    return (b[..., 0] - a[..., 0]) * (py - a[..., 1]) - (b[..., 1] - a[..., 1]) * (px - a[..., 0])
+
+def triangle_fragments(vertices, shape=None, window=None):
+    # vertices are the coordinates of the vertices of a triangle - 3x2 array
+    # shape is the optional (M, N) of the image, the bounding box is clamped to the pixels that can be drawn (scissor_span)
+    # window: optional rectangle of the pixels that are drawn (drawable, with shape)
+    # Evaluates the three edge functions over the bounding box of the triangle at once
+    # returns: ys, xs the pixels inside the triangle (or on its edges) - 1D arrays
+    #          weights the barycentric coordinates of each of these pixels - Px3 array
+    #          or None if the triangle has no area (line or point)
+    area = edge_function(vertices[0], vertices[1], vertices[2][0], vertices[2][1])
+    if area == 0:
+        return None
+
+    # The bounding box of the triangle
+    xmin = int(np.ceil(np.min(vertices[:, 0])))
+    xmax = int(np.floor(np.max(vertices[:, 0])))
+    ymin = int(np.ceil(np.min(vertices[:, 1])))
+    ymax = int(np.floor(np.max(vertices[:, 1])))
+    if shape is not None:
+        y0, y1, x0, x1 = drawable(shape, window)
+        xmin, xmax = max(xmin, x0), min(xmax, x1 - 1)
+        ymin, ymax = max(ymin, y0), min(ymax, y1 - 1)
+        if xmax < xmin or ymax < ymin: # nothing of the triangle is inside the image
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros((0, 3))
+    ys, xs = np.mgrid[ymin:ymax + 1, xmin:xmax + 1]
+
+    # w[i] is the edge function of the edge opposite to the vertex i, so w / area are the barycentric coordinates
+    w = np.stack([edge_function(vertices[1], vertices[2], xs, ys),
+                  edge_function(vertices[2], vertices[0], xs, ys),
+                  edge_function(vertices[0], vertices[1], xs, ys)], axis=-1)
+    # The pixel is covered if it is on the same side of all the edges as the triangle (the edges are included)
+    mask = np.all(w * area >= 0, axis=-1)
+    weights = w[mask] / area
+    return ys[mask], xs[mask], weights
+
+# FLAT SHADING - EDGE FUNCTIONS
+def f_shading_edge(img, vertices, vcolors):
+    # Same as f_shading but the covered pixels come from the edge functions over the bounding box
+    fragments = triangle_fragments(vertices, img.shape)
+    if fragments is None: # lines and points have no inside, the scan lines handle them
+        return f_shading(img, vertices, vcolors)
+    ys, xs, weights = fragments
+    img[ys, xs] = np.mean(vcolors, axis=0)
+    return img
+
+# GOURAUD SHADING - EDGE FUNCTIONS
+def gouraud_shading_edge(img, vertices, vcolors):
+    # Same as gouraud_shading but the colors are the barycentric combination of the vertex colors
+    # (the scan line interpolation of a linear function gives the same values)
+    fragments = triangle_fragments(vertices, img.shape)
+    if fragments is None: # lines and points have no inside, the scan lines handle them
+        return gouraud_shading(img, vertices, vcolors)
+    ys, xs, weights = fragments
+    img[ys, xs] = np.clip(weights @ vcolors, 0, 1) # only the new pixels, the rest of the image is already clipped
+    return img
+
+# BATCHED RASTERIZATION
+def line_weights(vertices, px, py):
+    # vertices are the vertices of zero area triangles - Fx3x2 array, one triangle for each fragment
+    # (px, py) are the fragments, they lie on the line of their triangle
+    # returns the weights of the three vertices for each fragment - Fx3 array, the colors that gouraud_shading gives to these pixels:
+    # on a horizontal line the color changes along x between the vertices sorted by x (two vertices on the same x give their mean),
+    # on any other line every scan line takes the mean of the colors of its two active edges (interpolated along y as in vector_interp)
+    F = len(vertices)
+    rows = np.arange(F)
+    start, end = vertices, vertices[:, [1, 2, 0]] # the three edges
+    low = np.trunc(np.minimum(start[..., 1], end[..., 1])) # the ymin, ymax of the edges as in f_triangle
+    high = np.trunc(np.maximum(start[..., 1], end[..., 1]))
+    ymax = np.max(high, axis=1, keepdims=True)
+    horizontal = np.min(low, axis=1) == ymax[:, 0]
+
+    # Other lines: the active edges of the scan line py, as in gouraud_shading
+    y = py[:, np.newaxis]
+    active = (low <= y) & (high > y) | (y == ymax) & (high == y) & (low != y)
+    dy = end[..., 1] - start[..., 1]
+    alpha = np.divide(y - start[..., 1], dy, out=np.full((F, 3), 0.5), where=dy != 0)
+    share = active / np.maximum(np.count_nonzero(active, axis=1, keepdims=True), 1)
+    weights = share * (1 - alpha) + np.roll(share * alpha, 1, axis=1) # the edge i goes from the vertex i to the vertex i + 1
+
+    # Horizontal lines: between the first and the second or the second and the third vertex sorted by x
+    order = np.argsort(vertices[..., 0], axis=1, kind='stable')
+    x = np.take_along_axis(vertices[..., 0], order, axis=1)
+    seg = ((px >= x[:, 1]) & (x[:, 1] != x[:, 2])).astype(int)
+    x_start, x_end = x[rows, seg], x[rows, seg + 1]
+    t = np.divide(px - x_start, x_end - x_start, out=np.zeros(F), where=x_end != x_start)
+    w_sorted = np.zeros((F, 3))
+    w_sorted[rows, seg] = 1 - t
+    w_sorted[rows, seg + 1] = t
+    first, last = x[:, 0] == x[:, 1], x[:, 1] == x[:, 2]
+    w_sorted[first, :2] = w_sorted[first, 1:2] / 2
+    w_sorted[last, 1:] = w_sorted[last, 1:2] / 2
+    w_line = np.zeros((F, 3))
+    np.put_along_axis(w_line, order, w_sorted, axis=1)
+    weights = np.where(horizontal[:, np.newaxis], w_line, weights)
+
+    # The triangle is a point: the mean of the three vertices
+    weights[horizontal & first & last] = 1 / 3
+    return weights
+
+def batch_fragments(vertices_triangle, height, width, max_cells=1 << 22, window=None):
+    # vertices_triangle are the vertices of K triangles - Kx3x2 array
+    # height, width are the dimensions of the image, the fragments outside of it are dropped
+    #   negative coordinates count from the end of the image as they do with img[y, x]
+    # max_cells is the maximum number of bounding box pixels that are evaluated with one call
+    # window: optional rectangle of the pixels that are kept (drawable)
+    # The triangles are grouped by the size of their bounding box (powers of 2) and each group is rasterized
+    # with the edge functions over stacked S x S grids, so the cost follows the covered pixels and not the number of triangles
+    # returns the flattened list of fragments: tri (the id of the triangle), ys, xs and weights (barycentric coordinates - Fx3 array)
+    v = np.asarray(vertices_triangle, dtype=float)
+    xmin = np.ceil(np.min(v[:, :, 0], axis=1)).astype(int)
+    xmax = np.floor(np.max(v[:, :, 0], axis=1)).astype(int)
+    ymin = np.ceil(np.min(v[:, :, 1], axis=1)).astype(int)
+    ymax = np.floor(np.max(v[:, :, 1], axis=1)).astype(int)
+    # the bounding boxes are clamped to the pixels that are kept, the grids only cover the visible part of the triangles
+    y0, y1, x0, x1 = drawable((height, width), window)
+    xmin, xmax = np.maximum(xmin, x0), np.minimum(xmax, x1 - 1)
+    ymin, ymax = np.maximum(ymin, y0), np.minimum(ymax, y1 - 1)
+    size = np.maximum(np.maximum(xmax - xmin, ymax - ymin) + 1, 1)
+    group = np.ceil(np.log2(size)).astype(int) # the side of the grid of the group is 2^group
+    area = edge_function(v[:, 0], v[:, 1], v[:, 2, 0], v[:, 2, 1])
+
+    tri, ys, xs, w_list = [], [], [], []
+    for g in np.unique(group):
+        S = 1 << g
+        oy, ox = np.mgrid[0:S, 0:S]
+        ids_group = np.flatnonzero(group == g)
+        chunk = max(1, max_cells // (S * S))
+        for start in range(0, len(ids_group), chunk):
+            ids = ids_group[start:start + chunk]
+            px = xmin[ids, None, None] + ox # G x S x S
+            py = ymin[ids, None, None] + oy
+            vg = v[ids][:, :, None, None, :] # the vertices broadcast over the grids
+            w = np.stack([edge_function(vg[:, 1], vg[:, 2], px, py),
+                          edge_function(vg[:, 2], vg[:, 0], px, py),
+                          edge_function(vg[:, 0], vg[:, 1], px, py)], axis=-1)
+            a = area[ids, None, None, None]
+            # inside the triangle or, for the zero area triangles, on their line
+            covered = np.where(a[..., 0] != 0, np.all(w * a >= 0, axis=-1), np.all(w == 0, axis=-1))
+            covered &= (px <= xmax[ids, None, None]) & (py <= ymax[ids, None, None])
+            covered &= (px >= x0) & (px < x1) & (py >= y0) & (py < y1)
+            gi, iy, ix = np.nonzero(covered)
+            tri.append(ids[gi])
+            ys.append(py[gi, iy, ix])
+            xs.append(px[gi, iy, ix])
+            w_list.append(w[gi, iy, ix])
+    if not tri:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros((0, 3))
+    tri, ys, xs, w = np.concatenate(tri), np.concatenate(ys), np.concatenate(xs), np.concatenate(w_list)
+
+    weights = np.empty(w.shape)
+    flat = area[tri] == 0
+    weights[~flat] = w[~flat] / area[tri[~flat], None]
+    weights[flat] = line_weights(v[tri[flat]], xs[flat], ys[flat])
+    return tri, ys % height, xs % width, weights
+
+def resolve_fragments(tri, ys, xs, weights, width, vdepth_triangle=None, zbuf=None):
+    # tri, ys, xs, weights are fragments from batch_fragments, width is the width of the image
+    # vdepth_triangle, zbuf: the depth of the vertices - Kx3 array and the depth buffer - MxN array (optional)
+    # Keeps one fragment for every pixel:
+    # without a depth buffer the one of the last triangle, later triangles cover the earlier ones as in the painter's algorithm
+    # with a depth buffer the nearest one, if it is nearer than zbuf (zbuf is updated)
+    # returns tri, ys, xs, weights of the kept fragments
+    if len(tri) == 0:
+        return tri, ys, xs, weights
+    pixel = ys * width + xs
+    if zbuf is None:
+        order = np.lexsort((tri, pixel))
+        keep = order[np.append(pixel[order][1:] != pixel[order][:-1], True)] # the last of each pixel
+    else:
+        z = np.einsum('fk,fk->f', weights, np.asarray(vdepth_triangle)[tri]).astype(zbuf.dtype)
+        order = np.lexsort((tri, z, pixel)) # on equal depth the earlier triangle stays, as with the strict test of depth_fragments
+        keep = order[np.append(True, pixel[order][1:] != pixel[order][:-1])] # the first (nearest) of each pixel
+        keep = keep[z[keep] < zbuf[ys[keep], xs[keep]]]
+        zbuf[ys[keep], xs[keep]] = z[keep]
+    return tri[keep], ys[keep], xs[keep], weights[keep]
+
+def batch_shading(img, vertices_triangle, vcolors_triangle, shading, vdepth_triangle=None, zbuf=None):
+    # img is the image to be shaded - MxNx3
+    # vertices_triangle are the vertices of K triangles - Kx3x2 array
+    # vcolors_triangle are the colors of their vertices - Kx3x3 array
+    # shading is "f" for flat shading, "g" for gouraud shading
+    # vdepth_triangle, zbuf: the depth of the vertices - Kx3 array and the depth buffer - MxN array (optional)
+    # Without a depth buffer the triangles are drawn in the given order (painter's algorithm), with it the nearest fragment is drawn
+    tri, ys, xs, weights = batch_fragments(vertices_triangle, img.shape[0], img.shape[1])
+    tri, ys, xs, weights = resolve_fragments(tri, ys, xs, weights, img.shape[1], vdepth_triangle, zbuf)
+
+    vcolors_triangle = np.asarray(vcolors_triangle, dtype=float)
+    if shading == "f":
+        img[ys, xs] = np.mean(vcolors_triangle, axis=1)[tri]
+    elif shading == "g":
+        img[ys, xs] = np.einsum('fk,fkc->fc', weights, vcolors_triangle[tri])
+    return img
+
+
+# Z-BUFFER
+def count(stats, key, value):
+    # Add value to the counter key of the stats dictionary (if there is one)
+    if stats is not None:
+        stats[key] = stats.get(key, 0) + value
+
+def depth_fragments(vertices, vdepth, zbuf, stats=None, window=None):
+    # vertices are the coordinates of the vertices of a triangle - 3x2 array
+    # vdepth is the depth of each vertex - 1x3 array
+    # zbuf is the depth of the nearest fragment drawn so far at each pixel - MxN array, updated with the visible fragments
+    # stats is an optional dictionary, the counters "fragments" and "fragments_hidden" are increased
+    # window: optional rectangle of the pixels that are drawn (drawable)
+    # returns ys, xs, weights (barycentric coordinates - Px3) of the fragments of the triangle that are nearer than zbuf
+    # so the occluded fragments are dropped before they are shaded
+    fragments = triangle_fragments(vertices, zbuf.shape, window)
+    if fragments is None: # lines and points: the pixels on their line
+        _, ys, xs, weights = batch_fragments(np.asarray(vertices)[np.newaxis], zbuf.shape[0], zbuf.shape[1], window=window)
+    else:
+        ys, xs, weights = fragments
+    z = (weights @ vdepth).astype(zbuf.dtype) # the depth of each fragment
+    visible = z < zbuf[ys, xs]
+    count(stats, "fragments", len(visible))
+    count(stats, "fragments_hidden", len(visible) - int(np.count_nonzero(visible)))
+    ys, xs, weights = ys[visible], xs[visible], weights[visible]
+    zbuf[ys, xs] = z[visible]
+    return ys, xs, weights
+
+# FLAT SHADING - Z-BUFFER
+def f_shading_depth(img, vertices, vcolors, vdepth, zbuf, window=None):
+    # Same as f_shading_edge but only the fragments that pass the depth test are shaded
+    ys, xs, weights = depth_fragments(vertices, vdepth, zbuf, window=window)
+    img[ys, xs] = np.mean(vcolors, axis=0)
+    return img
+
+# GOURAUD SHADING - Z-BUFFER
+def gouraud_shading_depth(img, vertices, vcolors, vdepth, zbuf, window=None):
+    # Same as gouraud_shading_edge but only the fragments that pass the depth test are shaded
+    ys, xs, weights = depth_fragments(vertices, vdepth, zbuf, window=window)
+    img[ys, xs] = weights @ vcolors
+    return img
+
+
+
+# FRAMEBUFFER
+def framebuffer(shape, bg_color, dtype=np.float64, out=None, window=None):
+    # shape: M, N - the size of the image
+    # bg_color: the color of the background - 1x3 array or a number
+    # dtype: the type of the image - np.float64, np.float32 or np.uint8 (a BGR image with values 0-255, it is rendered in float32)
+    # out: optional MxNx3 array which gets the image so that the memory is reused - a uint8 out gets the BGR image
+    # window: optional y0, y1, x0, x1, only this rectangle gets the background and the rest of out is not touched
+    # returns the MxNx3 image to render into, filled with the background color
+    if dtype not in (np.float64, np.float32, np.uint8):
+        raise ValueError("Invalid framebuffer type. Choose np.float64, np.float32 or np.uint8.")
+    if out is not None and out.shape != tuple(shape) + (3,):
+        raise ValueError("The out array must have the shape of the image.")
+    if out is not None and out.dtype != np.uint8:
+        img = out
+    else:
+        img = np.empty(tuple(shape) + (3,), dtype=np.float32 if dtype == np.uint8 or out is not None else dtype)
+    if window is None:
+        img[:] = bg_color
+    else:
+        y0, y1, x0, x1 = window
+        img[y0:y1, x0:x1] = bg_color
+    return img
+
+def depthbuffer(shape, window=None):
+    # shape: M, N - the size of the image
+    # window: optional y0, y1, x0, x1, only this rectangle is set (the depth test only reads the pixels that are drawn)
+    # returns the MxN depth buffer with an infinite depth at every pixel
+    if window is None:
+        return np.full(shape, np.inf, dtype=np.float32)
+    zbuf = np.empty(shape, dtype=np.float32)
+    y0, y1, x0, x1 = window
+    zbuf[y0:y1, x0:x1] = np.inf
+    return zbuf
+
+def finish_framebuffer(img, dtype=np.float64, out=None):
+    # img is the rendered image of framebuffer
+    # returns the image in the type that was asked for in framebuffer
+    if dtype == np.uint8 or out is not None and out.dtype == np.uint8:
+        return to_bgr8(img, out)
+    if out is not None and img is not out:
+        out[:] = img
+        return out
+    return img
+
+def to_bgr8(img, out=None, rows=64):
+    # img is an RGB image with values between 0 and 1 - MxNx3 array
+    # out: optional MxNx3 uint8 array which gets the result
+    # rows: the number of rows converted at a time, no full size temporary arrays are made
+    # returns the BGR uint8 image, the same as cv2.cvtColor(np.clip(img * 255, 0, 255).astype(np.uint8), cv2.COLOR_RGB2BGR)
+    if out is None:
+        out = np.empty(img.shape, dtype=np.uint8)
+    for r in range(0, img.shape[0], rows):
+        block = img[r:r + rows, :, ::-1] * 255
+        np.clip(block, 0, 255, out=block)
+        out[r:r + rows] = block
+    return out
+
+
+
+# SHARED MEMORY
+# The arrays that a pool of processes reads (tiles.render_tiled, batch.render_frames) are copied once in shared memory
+# and every process opens them by their description instead of getting a pickled copy of them.
+def share(array):
+    # array: the array to share
+    # returns: the shared memory block which has a copy of the array and the description that opens it in another process
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+def attach(spec):
+    # spec: the description of share
+    # returns: the shared memory block and the array in it
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype, buffer=block.buf)
+
 
 
 # RENDER IMAGE
-def render_img(faces,vertices,vcolors,depth,shading):
+def render_img(faces,vertices,vcolors,depth,shading,rasterizer="span",zbuffer=False,dtype=np.float64,out=None):
     # img is the image which is being shaded - MxNx3 array - contains K colored triangles which forms the 3D projection of an object
     # faces is an array w the three vertices which construct a triangle
     #   faces = [[0, 1, 2], [3, 2, 4], ...] hich contains the id of the vertices of the K triangles - Kx3 array - each row contains the ids of
@@ -192,15 +690,48 @@ def render_img(faces,vertices,vcolors,depth,shading):
     # vcolors is an array of the colors of the vertices of the object - Lx3 array - each row contains the RGB values of the corresponding vertex
     # depth is an array of the depth of the each vertex               - Lx1 array
     # shading is the shading method to be used                        - string - "f" for flat shading, "g" for gouraud shading
+    # rasterizer is the way the triangles are filled                  - string - "span" one slice per scan line, "pixel" pixel by pixel (legacy),
+    #                                                                              "edge" edge functions over the bounding box of the triangle,
+    #                                                                              "batch" all the triangles together with stacked arrays
+    # zbuffer: if True the visibility is decided per pixel with a depth buffer instead of sorting the triangles by depth
+    #          (only with the "edge" and "batch" rasterizers)
+    # dtype: the type of the image - np.float64, np.float32 or np.uint8 for the BGR image that cv2.imwrite saves (see framebuffer)
+    # out: optional array which gets the image, to reuse the memory of a previous render
+
+    if rasterizer == "edge":
+        flat, gouraud = f_shading_edge, gouraud_shading_edge
+    elif rasterizer == "batch":
+        pass # all the triangles are shaded at once by batch_shading
+    elif rasterizer in ("span", "pixel"):
+        span = rasterizer == "span"
+        flat = lambda img, vertices, vcolors: f_shading(img, vertices, vcolors, span)
+        gouraud = lambda img, vertices, vcolors: gouraud_shading(img, vertices, vcolors, span)
+    else:
+        raise ValueError("Invalid rasterizer. Choose 'span', 'pixel', 'edge' or 'batch'.")
+    if zbuffer and rasterizer not in ("edge", "batch"):
+        raise ValueError("The z-buffer needs the 'edge' or 'batch' rasterizer.")
 
     #img = np.ones((M,N,3)) # create a white image with MxNx3 dimensions
-    img = np.ones((res_h, res_w, 3)) # create a whit image with MxNx3 dimensions
+    img = framebuffer((res_h, res_w), 1, dtype, out) # create a whit image with MxNx3 dimensions
     K = len(faces)
 
     # Finding the depth of each triangle
-    triangle_depth = np.zeros(K)
-    for i in range(K):
-        triangle_depth[i] = np.mean(depth[faces[i]])
+    triangle_depth = np.mean(depth[faces], axis=1)
+
+    if zbuffer:
+        # The depth buffer decides the visibility, the triangles are drawn as they are
+        zbuf = np.full(img.shape[:2], np.inf, dtype=np.float32)
+        vertices_triangle = vertices[faces].astype(float)
+        vcolors_triangle = vcolors[faces].astype(float)
+        vdepth_triangle = depth[faces]
+        if rasterizer == "batch":
+            return finish_framebuffer(batch_shading(img, vertices_triangle, vcolors_triangle, shading, vdepth_triangle, zbuf), dtype, out)
+        for i in range(K):
+            if shading == "f":
+                img = f_shading_depth(img, vertices_triangle[i], vcolors_triangle[i], vdepth_triangle[i], zbuf)
+            elif shading == "g":
+                img = gouraud_shading_depth(img, vertices_triangle[i], vcolors_triangle[i], vdepth_triangle[i], zbuf)
+        return finish_framebuffer(img, dtype, out)
 
     # Sorting the array by ascending depth and the faces array accordingly
     sorted_indices_asc = np.argsort(triangle_depth) # the indices of the sorted array - i use them to sort both the triangle_depth and the faces array
@@ -208,16 +739,17 @@ def render_img(faces,vertices,vcolors,depth,shading):
     sorted_triangle_depth = triangle_depth[sorted_indices_desc] # the sorted triangle depth array
     sorted_faces = faces[sorted_indices_desc] # the sorted faces array
 
-    vertices_triangle = np.empty((K, 3, 2))  # K triangles, each with 3 vertices, each with 2 coordinates
-    vcolors_triangle = np.empty((K, 3, 3))   # K triangles, each with 3 vertices, each with 3 color components
+    # Defining the vertices and the colors of the triangles
+    vertices_triangle = vertices[sorted_faces].astype(float)  # K triangles, each with 3 vertices, each with 2 coordinates
+    vcolors_triangle = vcolors[sorted_faces].astype(float)    # K triangles, each with 3 vertices, each with 3 color components
+
+    if rasterizer == "batch":
+        return finish_framebuffer(batch_shading(img, vertices_triangle, vcolors_triangle, shading), dtype, out)
 
     for i in range(K):
-        # Defining the vertices and the colors of the current triangle
-            vertices_triangle[i] = vertices[sorted_faces[i]]
-            vcolors_triangle[i] = vcolors[sorted_faces[i]]
         # Shading the current triangle
             if shading == "f":
-                img = f_shading(img, vertices_triangle[i], vcolors_triangle[i])
+                img = flat(img, vertices_triangle[i], vcolors_triangle[i])
             elif shading == "g":
-                img = gouraud_shading(img, vertices_triangle[i], vcolors_triangle[i])
-    return img
\ No newline at end of file
+                img = gouraud(img, vertices_triangle[i], vcolors_triangle[i])
+    return finish_framebuffer(img, dtype, out)
\ No newline at end of file
@@ -50,6 +50,55 @@ def light(point, normal, vcolor, cam_pos, ka, kd, ks, n, l_pos, l_int):
     final_color = np.clip(final_color, 0, 1)
     return final_color
 
+# The geometric terms of the Phong model for many points and all the light sources, they do not depend on ka, kd, ks, n
+def light_terms(points, normals, cam_pos, l_pos, l_int):
+    # points: P x 3, the coordinates of the points (or 1 x 3, the same point for all of them)
+    # normals: P x 3, the normal vector at each point
+    # cam_pos, l_pos, l_int: the same as in light
+    # returns: LN: P x N, the cosine between the light direction and the normal (the diffuse term is kd * max(LN, 0))
+    #          VR: P x N, the cosine between the view and the reflection direction (the specular term is ks * VR ** n)
+    #          l_int: N x 3 (or N x 1), the intensities as they multiply the color
+    normals = np.atleast_2d(normals)
+    points = np.broadcast_to(points, normals.shape)
+    l_pos = np.atleast_2d(l_pos)
+    l_int = np.asarray(l_int)
+    if l_int.ndim == 1: # light reads l_int[i], a number when a single intensity is given
+        l_int = l_int[:len(l_pos), np.newaxis]
+
+    # L is the light direction vector - P x N x 3
+    L = l_pos[np.newaxis] - points[:, np.newaxis]
+    L = L / np.linalg.norm(L, axis=-1, keepdims=True)
+
+    # V is the view direction vector - P x 3
+    V = cam_pos - points
+    V = V / np.linalg.norm(V, axis=-1, keepdims=True)
+
+    # R is the reflection direction vector - P x N x 3
+    LN = np.einsum('plc,pc->pl', L, normals)
+    R = 2 * LN[..., np.newaxis] * normals[:, np.newaxis] - L
+    R = R / np.linalg.norm(R, axis=-1, keepdims=True)
+    VR = np.einsum('pc,plc->pl', V, R)
+    return LN, VR, l_int
+
+# The same Phong model for many points at once and all the light sources together
+def light_batch(points, normals, vcolors, cam_pos, ka, kd, ks, n, l_pos, l_int):
+    # points: P x 3, the coordinates of the points (or 1 x 3, the same point for all of them)
+    # normals: P x 3, the normal vector at each point
+    # vcolors: P x 3, the RGB color of each point
+    # cam_pos, ka, kd, ks, n, l_pos, l_int: the same as in light
+    # returns: P x 3, the color of each point - the values that light gives for each point one by one
+    vcolors = np.atleast_2d(vcolors)
+    LN, VR, l_int = light_terms(points, normals, cam_pos, l_pos, l_int)
+
+    # Diffuse and specular components of each light, summed over the lights in the same order as light
+    diff_intensity = kd * np.maximum(LN, 0)
+    Id = np.sum(diff_intensity[..., np.newaxis] * l_int * vcolors[:, np.newaxis], axis=1)
+    spec_intensity = ks * VR ** n
+    Is = np.sum(spec_intensity[..., np.newaxis] * l_int * vcolors[:, np.newaxis], axis=1)
+
+    final_color = ka + Id + Is
+    return np.clip(final_color, 0, 1)
+
 def calculate_normals(verts, faces):
     # verts: 3 x Nv, the coordinates of the vertices of the object
     # faces: 3 x NT, the triangles of the object (each column has the ascending indices of the kth triangle), 1 ≤ k ≤ NT
@@ -59,30 +108,23 @@ def calculate_normals(verts, faces):
 
     # Initialize the normals array
     normals = np.zeros((3, Nv))
-    
-    # Calculate normals for each face and accumulate
-    for i in range(NT):
-        # Get the vertex indices for the current face (adjusted for 0-indexing in Python)
-        v0, v1, v2 = faces[:, i]
-        
-        # Get the vertex coordinates
-        p0, p1, p2 = verts[:, v0], verts[:, v1], verts[:, v2]
-        
-        # Compute the two edge vectors
-        edge1 = p1 - p0
-        edge2 = p2 - p0
-        
-        # Compute the face normal using the cross product
-        face_normal = np.cross(edge1, edge2)
-        
-        # Normalize the face normal to ensure it's a unit vector
-        face_normal = face_normal / np.linalg.norm(face_normal)
-        
-        # Accumulate the face normal to the vertex normals
-        normals[:, v0] += face_normal
-        normals[:, v1] += face_normal
-        normals[:, v2] += face_normal
-
-    normals = normals / np.linalg.norm(normals, axis=0)
+
+    # Get the vertex coordinates of all the faces - 3 x NT each
+    p0, p1, p2 = verts[:, faces[0]], verts[:, faces[1]], verts[:, faces[2]]
+
+    # Compute the face normals using the cross product of the two edge vectors
+    face_normals = np.cross(p1 - p0, p2 - p0, axis=0)
+
+    # Normalize the face normals to unit vectors, a face with zero area gives a zero normal (not NaN)
+    face_norm = np.linalg.norm(face_normals, axis=0)
+    face_normals = np.divide(face_normals, face_norm, out=np.zeros_like(face_normals), where=face_norm > 0)
+
+    # Accumulate the face normals to the vertex normals - unbuffered, so a vertex shared by many faces gets all of them,
+    # in the same order as adding face by face (v0, v1, v2 of the first face, then the second face ...)
+    np.add.at(normals.T, faces.T.ravel(), np.repeat(face_normals.T, 3, axis=0))
+
+    # A vertex without any face (or with faces of zero area only) keeps a zero normal
+    vertex_norm = np.linalg.norm(normals, axis=0)
+    normals = np.divide(normals, vertex_norm, out=np.zeros_like(normals), where=vertex_norm > 0)
 
     return normals
\ No newline at end of file
@@ -0,0 +1,87 @@
+import numpy as np
+import transformations as trans
+import lighting as l
+
+# Levels of detail of an object: simplified versions of it made once with vertex clustering, the render draws the
+# coarsest one whose detail is still smaller than a pixel of the image. A far object whose triangles fall inside single
+# pixels is then drawn with a few big triangles instead of thousands that each cost a shading call and change nothing.
+# Vertex clustering: the space is split in cubes of side cell, all the vertices of a cube become one vertex (the mean of
+# their positions, colors and normals) and the triangles that lose a side (two vertices in the same cube) are removed.
+
+def cluster(verts, vert_colors, faces, normals, cell, uvs_faces=None):
+    # verts: 3 x Nv, the coordinates of the vertices of the object
+    # vert_colors: Nv x 3, the RGB color of each vertex
+    # faces: 3 x NT, the triangles of the object
+    # normals: 3 x Nv, the normal vectors of the vertices (lighting.calculate_normals)
+    # cell: the side of the cubes
+    # uvs_faces: optional NT x 3, the uv coordinates of the triangles (as in tmap), the kept triangles keep their uv corners
+    # returns: a level, a dictionary with "cell", "verts", "vert_colors", "faces", "normals" (and "uvs_faces") of the simplified object
+    cube = np.floor((verts - np.min(verts, axis=1, keepdims=True)) / cell).astype(np.int64) # 3 x Nv
+    size = np.max(cube, axis=1) + 1
+    key = (cube[0] * size[1] + cube[1]) * size[2] + cube[2]
+    _, cluster_of, counts = np.unique(key, return_inverse=True, return_counts=True)
+    cluster_of = cluster_of.ravel()
+
+    # The mean of the vertices of each cube, the normals are normalized again
+    def mean(values):
+        sums = np.zeros((len(counts), values.shape[1]))
+        np.add.at(sums, cluster_of, values)
+        return sums / counts[:, np.newaxis]
+    cluster_normals = mean(normals.T).T
+    norm = np.linalg.norm(cluster_normals, axis=0)
+    cluster_normals = np.divide(cluster_normals, norm, out=np.zeros_like(cluster_normals), where=norm > 0)
+
+    # The triangles with three different vertices, once (two triangles on the same vertices are one), in their order
+    new_faces = cluster_of[faces]
+    valid = np.flatnonzero((new_faces[0] != new_faces[1]) & (new_faces[1] != new_faces[2]) & (new_faces[0] != new_faces[2]))
+    _, first = np.unique(np.sort(new_faces[:, valid], axis=0), axis=1, return_index=True)
+    kept = valid[np.sort(first)]
+
+    level = {
+        "cell": cell,
+        "verts": mean(verts.T).T,
+        "vert_colors": mean(vert_colors),
+        "faces": new_faces[:, kept],
+        "normals": cluster_normals.astype(normals.dtype),
+    }
+    if uvs_faces is not None:
+        level["uvs_faces"] = uvs_faces[kept]
+    return level
+
+def build_levels(verts, vert_colors, faces, uvs_faces=None, count=4, min_faces=32):
+    # verts, vert_colors, faces, uvs_faces: the object (cluster)
+    # count: the maximum number of simplified levels, the side of the cubes doubles from one level to the next
+    #        starting from the mean length of the edges of the object
+    # min_faces: a level with fewer triangles is not made
+    # returns: list of levels, the first one is the object itself (cell 0) and the others are coarser and coarser
+    normals = l.calculate_normals(verts, faces)
+    levels = [{"cell": 0, "verts": verts, "vert_colors": vert_colors, "faces": faces, "normals": normals}]
+    if uvs_faces is not None:
+        levels[0]["uvs_faces"] = uvs_faces
+    edges = verts[:, faces] - verts[:, np.roll(faces, 1, axis=0)] # 3 x 3 x NT
+    cell = np.mean(np.linalg.norm(edges, axis=0))
+    for _ in range(count):
+        level = cluster(verts, vert_colors, faces, normals, cell, uvs_faces)
+        if level["faces"].shape[1] < min_faces:
+            break
+        levels.append(level)
+        cell *= 2
+    return levels
+
+def select_level(levels, focal, eye, lookat, up, M, N, H, W, pixels=1.0):
+    # levels: the levels of the object (build_levels)
+    # focal, eye, lookat, up, M, N, H, W: the camera of the render (render.render_object)
+    # pixels: the largest size of the cubes on the image, in pixels
+    # returns: the index of the coarsest level whose cubes are at most pixels wide on the image where the object is the nearest
+    #          (0, the object itself, when the camera is inside its bounding box or near it)
+    verts = levels[0]["verts"]
+    lower, upper = np.min(verts, axis=1), np.max(verts, axis=1)
+    corners = np.array(np.meshgrid(*zip(lower, upper))).reshape(3, -1) # the 8 corners of the bounding box
+    R, t = trans.lookat(eye, up, lookat)
+    depth = np.min(R[2] @ corners + np.reshape(t, 3)[2])
+    if depth <= 0:
+        return 0
+    # the side in the world of one pixel at this depth (rasterize after perspective_project)
+    pixel = depth * max(W / N, H / M) / focal
+    cells = np.array([level["cell"] for level in levels])
+    return int(np.flatnonzero(cells <= pixels * pixel)[-1])
\ No newline at end of file
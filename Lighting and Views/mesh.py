@@ -0,0 +1,75 @@
+import numpy as np
+import lighting as l
+
+def packed(array, dtype):
+    # returns: the array as a contiguous array of dtype (a copy only if it is not one already), None stays None
+    return None if array is None else np.ascontiguousarray(array, dtype=dtype)
+
+class Mesh:
+ # The arrays of an object in one layout: one row for each vertex and each triangle, every array contiguous,
+ # float32 positions, normals, colors and uvs and int32 faces (half the memory of float64 and int64 arrays).
+ # The renders of the homeworks take other layouts (verts 3 x Nv and faces 3 x NT here, v_pos Nv x 3 and t_pos_idx F x 3 in hw2),
+ # the properties give them as views of the same memory - a transpose is a view, it is never copied.
+    __slots__ = ("positions", "faces", "colors", "normals", "uvs", "uv_faces")
+    def __init__(self, positions: np.ndarray, faces: np.ndarray, colors: np.ndarray = None, normals: np.ndarray = None,
+                 uvs: np.ndarray = None, uv_faces: np.ndarray = None):
+        # positions: Nv x 3, the coordinates of the vertices
+        # faces: NT x 3, the indices of the vertices of each triangle
+        # colors: optional Nv x 3, the RGB color of each vertex
+        # normals: optional Nv x 3, the normal vectors of the vertices
+        # uvs: optional Nuv x 2, the uv coordinates
+        # uv_faces: optional NT x 3, the indices of the uv coordinates of each triangle
+        self.positions = packed(positions, np.float32)
+        self.faces = packed(faces, np.int32)
+        self.colors = packed(colors, np.float32)
+        self.normals = packed(normals, np.float32)
+        self.uvs = packed(uvs, np.float32)
+        self.uv_faces = packed(uv_faces, np.int32)
+
+    # The layouts of render.render_object and tmap.render_object_map
+    @property
+    def verts(self)-> np.ndarray:
+        # 3 x Nv, the coordinates of the vertices
+        return self.positions.T
+    @property
+    def face_indices(self)-> np.ndarray:
+        # 3 x NT, the triangles
+        return self.faces.T
+    @property
+    def vert_colors(self)-> np.ndarray:
+        # Nv x 3, the RGB color of each vertex
+        return self.colors
+    @property
+    def vertex_normals(self)-> np.ndarray:
+        # 3 x Nv, the normal vectors of the vertices (as lighting.calculate_normals)
+        return self.normals.T
+    @property
+    def uv_coords(self)-> np.ndarray:
+        # 2 x Nuv, the uv coordinates
+        return self.uvs.T
+
+    # The layouts of transform.render_object (hw2)
+    @property
+    def v_pos(self)-> np.ndarray:
+        # Nv x 3, the coordinates of the vertices
+        return self.positions
+    @property
+    def v_clr(self)-> np.ndarray:
+        # Nv x 3, the colors of the vertices
+        return self.colors
+    @property
+    def t_pos_idx(self)-> np.ndarray:
+        # NT x 3, the triangles
+        return self.faces
+
+    @property
+    def nbytes(self)-> int:
+        # the memory of all the arrays of the mesh
+        return sum(getattr(self, name).nbytes for name in self.__slots__ if getattr(self, name) is not None)
+
+def from_h3(data: dict)-> Mesh:
+    # data: the dictionary of h3.npy (assets.load)
+    # returns: the mesh of the object with its normals (lighting.calculate_normals), the uvs and the uv triangles
+    verts, faces = data['verts'], data['face_indices']
+    return Mesh(verts.T, faces.T, data['vertex_colors'].T, l.calculate_normals(verts, faces).T,
+                data['uvs'].T, data['face_uv_indices'].T)
\ No newline at end of file
@@ -1,10 +1,15 @@
 import numpy as np
 import transformations as trans
+import functions as f
 from shaders import *
-import lighting as l
+from scene import Scene
+import tiles
+import bvh
+from lod import build_levels, select_level
 
 def render_object(shader, focal, eye, lookat, up, bg_color, M, N, H, W,
-                  verts, vert_colors, faces, ka, kd, ks, n, lpos, lint, light_amb):
+                  verts, vert_colors, faces, ka, kd, ks, n, lpos, lint, light_amb, zbuffer=False, stats=None, scene=None, dtype=np.float64, out=None,
+                  workers=None, triangles=None, cull=False, near=None, frustum=False, lod=False, window=None):
     # shader: string {"gouraud", "phong"} deciding the coloring function
     # focal: number, the distance of the projection from the centre of the camera
     # eye:   3 x 1, the coordinates of the centre of the camera
@@ -23,35 +28,79 @@ def render_object(shader, focal, eye, lookat, up, bg_color, M, N, H, W,
     # lpos: N x 3, the positions of the light sources
     # lint: N x 3, the intensities of the light sources
     # light_amb: 3 x 1, the ambient light intensity
+    # zbuffer: if True the visibility is decided per pixel with a depth buffer instead of sorting the triangles by depth
+    # stats: optional dictionary, with zbuffer it gets the counters of the render: "fragments", "fragments_hidden",
+    #        "light_evals" (calls of lighting.light) and "light_saved" (the calls that the depth test avoided)
+    # scene: optional Scene, keeps the normals, the projection and the order of the triangles between the renders
+    #        of the same object and camera (e.g. a sweep of ka, kd, ks, n or of the lights only redoes the shading)
+    # dtype: the type of the image - np.float64, np.float32 or np.uint8 for a BGR image with values 0-255 (functions.framebuffer)
+    # out: optional M x N x 3 array which gets the image, to reuse the memory of a previous render
+    # workers: the number of processes that render the tiles of the image (tiles.render_tiled), None renders in this process
+    #          the image is exactly the same
+    # triangles: the triangles that are drawn in the order that they are drawn, None for all of them (scene.triangle_order)
+    # cull: if True the triangles behind the camera, outside the image and facing away from the camera are not drawn
+    #       (transformations.cull_triangles), stats gets the counters of the culled triangles
+    # near: optional depth of the near plane, the triangles are cut at it and only their part in front of it is drawn
+    #       (transformations.clip_near) - triangles then refers to the triangles of the clipped object
+    # frustum: if True the triangles outside the frustum of the camera are not drawn, they are found with the bounding volume
+    #          hierarchy of the object (bvh.frustum_triangles) which scene keeps between the renders
+    # lod: if True the object is drawn at the coarsest of its levels of detail whose simplification is smaller than a pixel
+    #      (lod.build_levels, lod.select_level), scene keeps the levels between the renders - triangles then refers to the
+    #      triangles of the level
+    # window: optional y0, y1, x0, x1, only this rectangle of the image is drawn and the rest of out is not touched
+    #         (the tiles of tiles.render_tiled), the rectangle gets the same pixels as the whole render
+
+    if scene is None:
+        scene = Scene() # nothing is kept after this render
+
+    mesh = dict(verts=verts, vert_colors=vert_colors, faces=faces) # the object as it was given, every tile simplifies and clips it again
+    if lod:
+        # the rest of the render draws the level, with the normals of the whole object averaged over its vertices
+        levels = scene.levels(verts, vert_colors, faces, build_levels)
+        level = levels[select_level(levels, focal, eye, lookat, up, M, N, H, W)]
+        verts, vert_colors, faces = level["verts"], level["vert_colors"], level["faces"]
 
     #* 1) Calculate the normals of the vertices
-    normals = l.calculate_normals(verts, faces)
+    normals = level["normals"] if lod else scene.normals(verts, faces)
 
     #* 2) Project the vertices onto the camera plane using the perspective_project function from transformations.py
-    # Calculate the rotation matrix and translation vector
-    R, t = trans.lookat(eye, up, lookat)
+    # and rasterize the projected vertices to image pixel coordinates
+    pixel_coords, depth_values = scene.projection(verts, focal, eye, lookat, up, M, N, H, W)
+    # pixel_coords: 2 x Nv and depth_values: 1 x Nv
 
-    # Project the vertices
-    projected_verts, depth_values = trans.perspective_project(verts, focal, R, t) 
-    # projected_verts: 2 x Nv and depth_values: 1 x Nv
+    if near is not None:
+        # the rest of the render draws the clipped object
+        verts, vert_colors, faces, normals, pixel_coords, depth_values = scene.clipped(verts, vert_colors, faces, normals, focal, eye, lookat, up, M, N, H, W, near)
 
-    # Rasterize the projected vertices to image pixel coordinates
-    pixel_coords = trans.rasterize(projected_verts, W, H, N, M).astype(int)
-    # pixel_coords: 2 x Nv
+    if workers is not None and workers > 1 and stats is not None:
+        raise ValueError("The stats of a render are not counted with workers.")
 
-    #! new render function, i cannot use the old because i want to include the phong shading
+    # Sort the triangles by their depth
+    # with zbuffer the depth buffer decides the visibility, the triangles are drawn from the nearest to the farthest
+    # so that the depth test rejects the hidden fragments before they are lit, else by descending depth
+    if triangles is None:
+        triangles = scene.triangle_order(faces, depth_values, zbuffer)
+    if frustum:
+        # whole nodes of the hierarchy are dropped or kept at once, the order of the others stays the same
+        triangles = triangles[bvh.frustum_triangles(scene.bvh(verts, faces, bvh.build_bvh), focal, eye, lookat, up, M, N, H, W)[triangles]]
+    if cull:
+        # the culled triangles are dropped from the sorted order, the others are drawn in the same order as without culling
+        triangles = triangles[trans.cull_triangles(verts, faces, eye, pixel_coords, depth_values, M, N, stats)[triangles]]
 
-    # Initialize the image
-    img = np.full((M, N, 3), bg_color) # Create an image with MxNx3 dimensions with the backround color
+    if workers is not None and workers > 1:
+        arguments = dict(shader=shader, focal=focal, eye=eye, lookat=lookat, up=up, bg_color=bg_color, M=M, N=N, H=H, W=W,
+                         **mesh, ka=ka, kd=kd, ks=ks, n=n, lpos=lpos, lint=lint, light_amb=light_amb, zbuffer=zbuffer, near=near, lod=lod)
+        return tiles.render_tiled("render", "render_object", arguments, ("verts", "vert_colors", "faces"),
+                                  pixel_coords, faces, triangles, M, N, workers, dtype=dtype, out=out)
 
-    # Compute triangle_depth
-    triangle_depth = np.mean(depth_values[faces], axis=0)
+    #! new render function, i cannot use the old because i want to include the phong shading
 
-    # Sorting the array by descending depth
-    sorted_triangles_asc = np.argsort(triangle_depth)
-    sorted_triangles_desc = sorted_triangles_asc[::-1]
+    # Initialize the image
+    img = f.framebuffer((M, N), bg_color, dtype, out, window) # Create an image with MxNx3 dimensions with the backround color
+    zbuf = f.depthbuffer((M, N), window) if zbuffer else None
+    parts = f.window_parts(window, (M, N))
 
-    for triangle in sorted_triangles_desc:
+    for triangle in triangles:
 
         vertices_triangle = faces[:, triangle] # size 3x1
       
@@ -59,11 +108,17 @@ def render_object(shader, focal, eye, lookat, up, bg_color, M, N, H, W,
         # pixel_coords 2xNv so vertices_triangle2d are 3x2
         vcolors_triangle = vert_colors[vertices_triangle, :].T
         bcoords = np.mean(verts[:, vertices_triangle], axis=0).T
+        depth_triangle = depth_values[vertices_triangle]
+
+        for part in f.triangle_windows(vertices_triangle2d, parts):
+            if shader == "gouraud":
+                img = shade_gouraud(vertices_triangle2d.T, normals[:, vertices_triangle], vcolors_triangle, bcoords, eye, ka, kd, ks, n, lpos, lint, light_amb, img, depth_triangle, zbuf, stats, part)
+            elif shader == "phong":
+                img = shade_phong(vertices_triangle2d.T, normals[:, vertices_triangle], vcolors_triangle, bcoords, eye, ka, kd, ks, n, lpos, lint, light_amb, img, depth_triangle, zbuf, stats, part)
+            else:
+                raise ValueError("Invalid shader type. Choose 'gouraud' or 'phong'.")
 
-        if shader == "gouraud":
-            img = shade_gouraud(vertices_triangle2d.T, normals[:, vertices_triangle], vcolors_triangle, bcoords, eye, ka, kd, ks, n, lpos, lint, light_amb, img)
-        elif shader == "phong":
-            img = shade_phong(vertices_triangle2d.T, normals[:, vertices_triangle], vcolors_triangle, bcoords, eye, ka, kd, ks, n, lpos, lint, light_amb, img)
-        else:
-            raise ValueError("Invalid shader type. Choose 'gouraud' or 'phong'.")
-    return img
\ No newline at end of file
+    if stats is not None and zbuffer:
+        # Phong lights every fragment, Gouraud the three vertices of every triangle
+        stats["light_saved"] = stats.get("fragments_hidden", 0) if shader == "phong" else 3 * stats.get("triangles_hidden", 0)
+    return f.finish_framebuffer(img, dtype, out)
\ No newline at end of file
@@ -0,0 +1,95 @@
+import os
+import hashlib
+import numpy as np
+import transformations as trans
+import lighting as l
+
+def fingerprint(*arrays):
+    # Returns a key that changes when any of the arrays changes (shape, type or any value)
+    # arrays: numbers or numpy arrays (also lists of numbers)
+    key = []
+    for a in arrays:
+        if isinstance(a, np.memmap) and a.mode == 'r':
+            # A read only memory mapped asset cannot change without its file, the file and the place in it are enough
+            # (hashing it would read all of it from the disk)
+            key.append((a.filename, os.path.getmtime(a.filename), a.shape, a.strides, a.dtype.str, a.ctypes.data))
+            continue
+        a = np.asarray(a)
+        layout = 'C'
+        if not a.flags.c_contiguous and a.flags.f_contiguous:
+            # a transposed view (e.g. Mesh.verts) is hashed through its transpose, without a copy of it
+            a, layout = a.T, 'F'
+        a = np.ascontiguousarray(a)
+        key.append((a.shape, layout, a.dtype.str, hashlib.blake2b(a.data, digest_size=16).hexdigest()))
+    return tuple(key)
+
+class Scene:
+ # Cache of the quantities that the renders derive from the object, the camera and the texture.
+ # Each one is computed the first time it is asked for and is kept together with the fingerprint of its inputs,
+ # when the inputs change (even in place) it is computed again. A sweep over ka, kd, ks, n or the lights
+ # reuses the normals, the projection and the order of the triangles and only redoes the shading.
+    def __init__(self):
+        self.cache = {} # name -> (key, value)
+        self.hits = 0
+        self.misses = 0
+    def memo(self, name, inputs, compute):
+        # Returns the cached value of name if it was computed from the same inputs, else compute() which is then kept
+        key = fingerprint(*inputs)
+        if name in self.cache and self.cache[name][0] == key:
+            self.hits += 1
+            return self.cache[name][1]
+        self.misses += 1
+        value = compute()
+        self.cache[name] = (key, value)
+        return value
+    def normals(self, verts, faces):
+        # returns: 3 x Nv, the normal vectors of the vertices (lighting.calculate_normals)
+        return self.memo("normals", (verts, faces), lambda: l.calculate_normals(verts, faces))
+    def projection(self, verts, focal, eye, lookat, up, M, N, H, W):
+        # returns: the pixel coordinates 2 x Nv and the depth values 1 x Nv of the vertices seen from the camera
+        def compute():
+            R, t = trans.lookat(eye, up, lookat)
+            pixel_coords, depth_values = trans.project_vertices(verts, focal, R, t, W, H, N, M)
+            return pixel_coords.astype(int), depth_values
+        return self.memo("projection", (verts, focal, eye, lookat, up, M, N, H, W), compute)
+    def clipped(self, verts, vert_colors, faces, normals, focal, eye, lookat, up, M, N, H, W, near):
+        # normals: 3 x Nv, the normals of the vertices that are drawn (e.g. the normals of a level of detail),
+        #          interpolated with the colors - the clipped object is kept by all its inputs, one entry for any mesh
+        # returns: the object cut at the near plane (transformations.clip_near) and the projection of its vertices,
+        #          verts 3 x Nv', vert_colors Nv' x 3, faces 3 x NT', normals 3 x Nv' (interpolated from the normals of the object),
+        #          pixel_coords 2 x Nv' and depth_values 1 x Nv'
+        def compute():
+            depth_values = self.projection(verts, focal, eye, lookat, up, M, N, H, W)[1]
+            clip_verts, clip_faces, clip_colors, clip_normals = trans.clip_near(verts, faces, depth_values, near, vert_colors.T, normals)
+            R, t = trans.lookat(eye, up, lookat)
+            pixel_coords, clip_depth = trans.project_vertices(clip_verts, focal, R, t, W, H, N, M)
+            return clip_verts, clip_colors.T, clip_faces, clip_normals, pixel_coords.astype(int), clip_depth
+        return self.memo("clipped", (verts, vert_colors, faces, normals, focal, eye, lookat, up, M, N, H, W, near), compute)
+    def triangle_order(self, faces, depth_values, zbuffer):
+        # depth_values: 1 x Nv, the depth of the vertices (from projection)
+        # returns: the triangles in the order that they are drawn, from the nearest to the farthest with zbuffer
+        #          else from the farthest to the nearest (painter's algorithm)
+        def compute():
+            triangle_depth = np.mean(depth_values[faces], axis=0)
+            sorted_triangles_asc = np.argsort(triangle_depth)
+            return sorted_triangles_asc if zbuffer else sorted_triangles_asc[::-1]
+        return self.memo("triangle_order", (faces, depth_values, zbuffer), compute)
+    def uv_colors(self, uvs, uvs_faces, texture_map, sample):
+        # sample: the function that reads the texture at an array of uv points (tmap.bilerp_array)
+        # returns: NT x 3 x 3, the color of the texture at the 3 vertices of each triangle
+        def compute():
+            uv_coords = uvs[:, uvs_faces].transpose(1, 2, 0) # NT x 3 x 2
+            return sample(uv_coords.reshape(-1, 2), texture_map).reshape(uv_coords.shape[:2] + (-1,))
+        return self.memo("uv_colors " + sample.__name__, (uvs, uvs_faces, texture_map), compute)
+    def mipmaps(self, texture_map, build):
+        # build: the function that makes the levels of the texture (tmap.build_mipmaps)
+        # returns: the mipmap levels of the texture
+        return self.memo("mipmaps " + build.__name__, (texture_map,), lambda: build(texture_map))
+    def bvh(self, verts, faces, build):
+        # build: the function that builds the hierarchy (bvh.build_bvh)
+        # returns: the bounding volume hierarchy of the triangles of the object, built once for all the cameras
+        return self.memo("bvh " + build.__name__, (verts, faces), lambda: build(verts, faces))
+    def levels(self, verts, vert_colors, faces, build):
+        # build: the function that makes the levels of detail (lod.build_levels)
+        # returns: the levels of detail of the object, made once for all the cameras
+        return self.memo("levels " + build.__name__, (verts, vert_colors, faces), lambda: build(verts, vert_colors, faces))
\ No newline at end of file
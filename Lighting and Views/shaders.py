@@ -3,7 +3,7 @@ import functions as f
 import lighting as l
 from functions import *
 
-def shade_gouraud(verts_p, verts_n, verts_c, b_coords, cam_pos, ka, kd, ks, n, l_pos, l_int, l_amb, X):
+def shade_gouraud(verts_p, verts_n, verts_c, b_coords, cam_pos, ka, kd, ks, n, l_pos, l_int, l_amb, X, verts_d=None, zbuf=None, stats=None, window=None):
     # verts_p: 2 x 3, the 2D coordinates of the vertices of the triangle
     # verts_n: 3 x 3, the normal vectors of the vertices of the triangle - each column is a normal vector
     # verts_c: 3 x 3, the RGB color of the vertices of the triangle - each column is a color
@@ -17,23 +17,38 @@ def shade_gouraud(verts_p, verts_n, verts_c, b_coords, cam_pos, ka, kd, ks, n, l
     # l_int: N x 3, the intensities of the light sources
     # l_amb: 1 x 3, the ambient light intensity of the scene
     # X: M x N x 3, the image with preexisting colored triangles
+    # verts_d: 1 x 3, the depth of the vertices of the triangle (only with zbuf)
+    # zbuf: M x N, the depth buffer - if it is given only the fragments nearer than it are shaded and it is updated
+    # stats: optional dictionary with the counters of the depth test and "light_evals", "triangles_hidden"
+    # window: optional y0, y1, x0, x1, only the pixels of this rectangle are drawn (functions.drawable)
     # returns: Y: M x N x 3, the image with the triangle shaded using Gouraud shading
 
+    if zbuf is not None:
+        # The depth test comes first, a hidden triangle needs no lighting at all
+        ys, xs, weights = f.depth_fragments(verts_p.T, verts_d, zbuf, stats, window)
+        if len(ys) == 0:
+            f.count(stats, "triangles_hidden", 1)
+            return X
+    f.count(stats, "light_evals", verts_c.shape[1])
+
     # Calculate the ambient light component
     ambient_component = ka * l_amb
 
-    # For each vertex of the triangle, find the lighting
-    for i in range(verts_c.shape[0]):
-        verts_c[:, i] = l.light(b_coords, verts_n[:, i].T, verts_c[:, i].T, cam_pos, ambient_component, kd, ks, n, l_pos, l_int).T
+    # Find the lighting of the three vertices of the triangle
+    verts_c = l.light_batch(b_coords, verts_n.T, verts_c.T, cam_pos, ambient_component, kd, ks, n, l_pos, l_int).T
 
     vertices = verts_p.T
     vcolors = verts_c.T
 
+    if zbuf is not None:
+        X[ys, xs] = np.clip(weights @ vcolors, 0, 1)
+        return X
+
     # Call gouraud_shading 
-    Y = f.gouraud_shading(X, vertices, vcolors)
+    Y = f.gouraud_shading(X, vertices, vcolors, window=window)
     return Y
 
-def shade_phong(verts_p, verts_n, verts_c, b_coords, cam_pos, ka, kd, ks, n, l_pos, l_int, l_amb, X):
+def shade_phong(verts_p, verts_n, verts_c, b_coords, cam_pos, ka, kd, ks, n, l_pos, l_int, l_amb, X, verts_d=None, zbuf=None, stats=None, window=None):
     # verts_p: 2 x 3, the 2D coordinates of the vertices of the triangle
     # verts_n: 3 x 3, the normal vectors of the vertices of the triangle - each column is a normal vector
     # verts_c: 3 x 3, the RGB color of the vertices of the triangle - each column is a color
@@ -47,6 +62,10 @@ def shade_phong(verts_p, verts_n, verts_c, b_coords, cam_pos, ka, kd, ks, n, l_p
     # l_int: N x 3, the intensities of the light sources
     # l_amb: 1 x 3, the ambient light intensity of the scene
     # X: M x N x 3, the image with preexisting colored triangles
+    # verts_d: 1 x 3, the depth of the vertices of the triangle (only with zbuf)
+    # zbuf: M x N, the depth buffer - if it is given only the fragments nearer than it are shaded and it is updated
+    # stats: optional dictionary with the counters of the depth test and "light_evals" (only with zbuf)
+    # window: optional y0, y1, x0, x1, only the pixels of this rectangle are drawn (functions.drawable)
     # returns: Y: M x N x 3, the image with the triangle shaded using Phong shading
 
     ambient_component = ka * l_amb
@@ -56,6 +75,15 @@ def shade_phong(verts_p, verts_n, verts_c, b_coords, cam_pos, ka, kd, ks, n, l_p
     normalvecs = verts_n.T
     img = X
 
+    if zbuf is not None:
+        # The depth test comes first, the light is computed only for the fragments that pass it
+        ys, xs, weights = f.depth_fragments(vertices, verts_d, zbuf, stats, window)
+        f.count(stats, "light_evals", len(ys))
+        interp_colors = weights @ vcolors
+        interp_normals = weights @ normalvecs
+        img[ys, xs] = l.light_batch(b_coords, interp_normals, interp_colors, cam_pos, ambient_component, kd, ks, n, l_pos, l_int)
+        return img
+
     # img is the image to be shaded with likely preexisting triangles - MxNx3 
     # vertices are the coordinates of the vertices of a triangle - 3x2 array
     # vcolors are the colors at these vertices at rgb values - 3x3 array
@@ -68,11 +96,14 @@ def shade_phong(verts_p, verts_n, verts_c, b_coords, cam_pos, ka, kd, ks, n, l_p
         # Compute the light from one vertex
         mean_vcolor = np.mean(vcolors, axis=0)
         color_light = l.light(b_coords, verts_n[:, 0].T, mean_vcolor, cam_pos, ambient_component, kd, ks, n, l_pos, l_int)
-        img[int(vertices[0][1]), int(vertices[0][0])] = color_light # if the triangle is a point then the shading is the same as the flat shading
+        y, x = int(vertices[0][1]), int(vertices[0][0])
+        y0, y1, x0, x1 = f.drawable(img.shape, window)
+        if y0 <= y < y1 and x0 <= x < x1: # the point is drawn only if it is inside the image
+            img[y, x] = color_light # if the triangle is a point then the shading is the same as the flat shading
     else:
 
-        # Start the shading part using the scan lines
-        for y in range(ymin, ymax + 1, 1):
+        # Start the shading part using the scan lines (only the ones inside the image, f.scissor_rows)
+        for y in f.scissor_rows(img, ymin, ymax, window):
             # Case: the triangle is a horizontal line (y[0] = y[1] = y[2])
             if ymax == ymin:
                 sorted_indices_asc = np.argsort(vertices[:, 0]) # sort the vertices by x in ascending order and "return" the indices of the sorted array 
@@ -84,7 +115,8 @@ def shade_phong(verts_p, verts_n, verts_c, b_coords, cam_pos, ka, kd, ks, n, l_p
                 if sorted_vertices[0][0] == sorted_vertices[1][0] and sorted_vcolors[0][0] != sorted_vcolors[1][0]:
                     concatenated_array = np.concatenate([sorted_vcolors[0][np.newaxis, :], sorted_vcolors[1][np.newaxis, :]], axis=0)
                     # concatenated_normals = np.concatenate([sorted_normals[0][np.newaxis, :], sorted_normals[1][np.newaxis, :]], axis=0)
-                    for x in range (int(sorted_vertices[0][0]), int(sorted_vertices[2][0]) + 1, 1):
+                    x_left, x_right = f.scissor_span(img, int(sorted_vertices[0][0]), int(sorted_vertices[2][0]), window)
+                    for x in range (x_left, x_right + 1, 1):
                         interp_color = vector_interp(sorted_vertices[0], sorted_vertices[2], sorted_vcolors[0], np.mean(concatenated_array, axis=0), x, 1)
                         interp_normal = vector_interp(sorted_vertices[0], sorted_vertices[2], sorted_normals[0], sorted_normals[2], x, 1)
                         light = l.light(b_coords, interp_normal, interp_color, cam_pos, ambient_component, kd, ks, n, l_pos, l_int) 
@@ -92,20 +124,23 @@ def shade_phong(verts_p, verts_n, verts_c, b_coords, cam_pos, ka, kd, ks, n, l_p
                 
                 elif sorted_vertices[1][0] == sorted_vertices[2][0] and sorted_vcolors[1][0] != sorted_vcolors[2][0]:
                     concatenated_array = np.concatenate([sorted_vcolors[1][np.newaxis, :], sorted_vcolors[2][np.newaxis, :]], axis=0)
-                    for x in range(int(sorted_vertices[0][0]), int(sorted_vertices[2][0]) + 1, 1):
+                    x_left, x_right = f.scissor_span(img, int(sorted_vertices[0][0]), int(sorted_vertices[2][0]), window)
+                    for x in range(x_left, x_right + 1, 1):
                         interp_color = vector_interp(sorted_vertices[0], sorted_vertices[2], sorted_vcolors[0], np.mean(concatenated_array, axis=0), x, 1)
                         interp_normal = vector_interp(sorted_vertices[0], sorted_vertices[2], sorted_normals[0], sorted_normals[2], x, 1)
                         light = l.light(b_coords, interp_normal, interp_color, cam_pos, ambient_component, kd, ks, n, l_pos, l_int)
                         img[y, x] = light  # Apply lighting to color
                 else:
                     # shade the pixels between the first two vertices
-                    for x in range(int(sorted_vertices[0][0]), int(sorted_vertices[1][0]) + 1, 1):
+                    x_left, x_right = f.scissor_span(img, int(sorted_vertices[0][0]), int(sorted_vertices[1][0]), window)
+                    for x in range(x_left, x_right + 1, 1):
                         interp_color = vector_interp(sorted_vertices[0], sorted_vertices[1], sorted_vcolors[0], sorted_vcolors[1], x, 1)
                         interp_normal = vector_interp(sorted_vertices[0], sorted_vertices[1], sorted_normals[0], sorted_normals[1], x, 1)
                         light = l.light(b_coords, interp_normal, interp_color, cam_pos, ambient_component, kd, ks, n, l_pos, l_int)
                         img[y, x] =  light  # Apply lighting to color
                     # shade the pixels between the second and the third vertex
-                    for x in range(int(sorted_vertices[1][0]), int(sorted_vertices[2][0]) + 1, 1):
+                    x_left, x_right = f.scissor_span(img, int(sorted_vertices[1][0]), int(sorted_vertices[2][0]), window)
+                    for x in range(x_left, x_right + 1, 1):
                         interp_color = vector_interp(sorted_vertices[1], sorted_vertices[2], sorted_vcolors[1], sorted_vcolors[2], x, 1)
                         interp_normal = vector_interp(sorted_vertices[1], sorted_vertices[2], sorted_normals[1], sorted_normals[2], x, 1)  # Interpolate normal
                         light = l.light(b_coords, interp_normal, interp_color, cam_pos, ambient_component, kd, ks, n, l_pos, l_int)  # Compute lighting
@@ -146,10 +181,16 @@ def shade_phong(verts_p, verts_n, verts_c, b_coords, cam_pos, ka, kd, ks, n, l_p
 
                 sorted_active_limit_points = sorted(active_limit_points, key=lambda x: x[0]) # sort the active limit points by x in ascending order
         
-                for x in range(np.ceil(np.round(sorted_active_limit_points[0][0], decimals=13)).astype(int), np.floor(np.round(sorted_active_limit_points[1][0], decimals=13)).astype(int) + 1, 1): # for every pixel in the scan line
-                    interp_color = vector_interp(active_limit_points[0], active_limit_points[1], color_alp[0], color_alp[1], x, 1)
-                    interp_normal = vector_interp(active_limit_points[0], active_limit_points[1], normal[0], normal[1], x, 1)
-                    # Compute the light from the interpolated point
-                    color_light = l.light(b_coords, interp_normal, interp_color, cam_pos, ambient_component, kd, ks, n, l_pos, l_int)
-                    img[y, x] = np.clip(color_light, 0, 1)
-    return np.clip(img, 0, 1) # return the updated image
\ No newline at end of file
+                x_left = np.ceil(np.round(sorted_active_limit_points[0][0], decimals=13)).astype(int)
+                x_right = np.floor(np.round(sorted_active_limit_points[1][0], decimals=13)).astype(int)
+                x_left, x_right = f.scissor_span(img, x_left, x_right, window)
+                if x_right < x_left:
+                    continue
+                # Interpolate and light every pixel of the scan line in one call
+                xs = np.arange(x_left, x_right + 1)
+                interp_colors = vector_interp_span(active_limit_points[0], active_limit_points[1], color_alp[0], color_alp[1], xs, 1)
+                interp_normals = vector_interp_span(active_limit_points[0], active_limit_points[1], normal[0], normal[1], xs, 1)
+                img[span_index(y, x_left, x_right)] = l.light_batch(b_coords, interp_normals, interp_colors, cam_pos, ambient_component, kd, ks, n, l_pos, l_int)
+    view = f.window_view(img, window) # only the pixels of the window can have changed
+    np.clip(view, 0, 1, out=view)
+    return img # return the updated image
\ No newline at end of file
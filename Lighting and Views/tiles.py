@@ -0,0 +1,106 @@
+import importlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import functions as f
+from functions import share, attach
+from scene import Scene
+
+# Tiled rendering: the M x N image is split in tiles and every tile is rendered by a process of a pool.
+# The triangles are binned to the tiles that their bounding box touches and every tile draws only its own triangles,
+# in the same order as the whole render, so every pixel gets exactly the same color as in render_object.
+# The arrays of the mesh (and the texture) are given to the processes through shared memory, not pickled to each one,
+# and every process draws its tile straight into the shared image: the rasterizers are scissored to the tile (window)
+# so a process only touches the pixels of its own tile.
+
+def bin_triangles(pixel_coords, faces, triangles, M, N, tile):
+    # pixel_coords: 2 x Nv, the pixel coordinates of the vertices
+    # faces: 3 x NT, the triangles of the object
+    # triangles: the triangles in the order that they are drawn
+    # M, N: height and width of the image
+    # tile: the size of the (square) tiles in pixels
+    # returns: list of (y0, y1, x0, x1, the triangles of the tile in the order that they are drawn)
+    corners = pixel_coords[:, faces[:, triangles]] # 2 x 3 x NT
+    xmin, ymin = np.min(corners, axis=1)
+    xmax, ymax = np.max(corners, axis=1)
+    # the negative pixel coordinates are drawn at the other side of the image (the indices wrap around),
+    # a triangle further than one image away from it is given to every tile
+    everywhere = (xmin < -N) | (ymin < -M) | (xmax >= N) | (ymax >= M)
+    def covers(low, high, a0, a1, size):
+        # True for the triangles that cover a pixel between a0 and a1 directly or after the wrap around
+        return (low < a1) & (high >= a0) | (low < a1 - size) & (high >= a0 - size)
+    tiles = []
+    for y0 in range(0, M, tile):
+        for x0 in range(0, N, tile):
+            y1, x1 = min(y0 + tile, M), min(x0 + tile, N)
+            inside = covers(xmin, xmax, x0, x1, N) & covers(ymin, ymax, y0, y1, M)
+            tiles.append((y0, y1, x0, x1, triangles[inside | everywhere]))
+    return tiles
+
+# Every process keeps the normals, the projection (and the texture colors) of the mesh between its tiles
+worker_scene = Scene()
+
+def render_tile(module, function, arguments, shared, triangles, bounds, image, dtype):
+    # module, function: the name of the render function (e.g. "render", "render_object")
+    # arguments: the arguments of the render function which are not shared
+    # shared: the descriptions of the shared arrays of the arguments
+    # triangles: the triangles of the tile in the order that they are drawn
+    # bounds: y0, y1, x0, x1 of the tile, the window of the render function
+    # image: the description of the shared image (attach), the render function draws the tile into it
+    # dtype: the type of the image
+    blocks = []
+    try:
+        arguments = dict(arguments)
+        for name, spec in shared.items():
+            block, arguments[name] = attach(spec)
+            blocks.append(block)
+        block, img = attach(image)
+        blocks.append(block)
+        render = getattr(importlib.import_module(module), function)
+        render(**arguments, triangles=triangles, scene=worker_scene, dtype=dtype, out=img, window=bounds)
+        # the arrays must be released before their blocks are closed
+        del arguments, img
+    finally:
+        for block in blocks:
+            block.close()
+
+def render_tiled(module, function, arguments, shared, pixel_coords, faces, triangles, M, N, workers, tile=128, dtype=np.float64, out=None):
+    # module, function: the name of the render function that renders every tile (it must accept triangles, scene, dtype, out
+    #                   and window, and draw only the pixels of the window into out)
+    # arguments: dictionary with the arguments of the render function
+    # shared: the names of the arguments that are given through shared memory (the arrays of the mesh and the texture)
+    # pixel_coords: 2 x Nv, the pixel coordinates of the vertices
+    # faces: 3 x NT, the triangles of the object
+    # triangles: the triangles in the order that the render function draws them
+    # M, N: height and width of the image
+    # workers: the number of processes
+    # tile: the size of the tiles in pixels
+    # dtype, out: the type of the image and the optional array that gets it (functions.framebuffer)
+    # returns: M x N x 3, the same image as the render function
+    f.framebuffer((0, 0), 0, dtype) # checks the type
+    # the tiles are rendered in the type of the image that render_object renders into (a uint8 image is rendered in float32)
+    if out is not None and out.dtype != np.uint8:
+        tile_dtype = out.dtype.type
+    else:
+        tile_dtype = np.float32 if dtype == np.uint8 or out is not None else dtype
+    blocks = [] # the blocks are made here, they are removed when the render ends
+    try:
+        specs = {}
+        for name in shared:
+            block, specs[name] = share(arguments[name])
+            blocks.append(block)
+        others = {name: value for name, value in arguments.items() if name not in shared}
+        image = shared_memory.SharedMemory(create=True, size=M * N * 3 * np.dtype(tile_dtype).itemsize)
+        blocks.append(image)
+        image_spec = (image.name, (M, N, 3), np.dtype(tile_dtype).str)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tasks = [pool.submit(render_tile, module, function, others, specs, tile_triangles, (y0, y1, x0, x1), image_spec, tile_dtype)
+                     for y0, y1, x0, x1, tile_triangles in bin_triangles(pixel_coords, faces, triangles, M, N, tile)]
+            for task in tasks:
+                task.result()
+        img = np.array(np.ndarray((M, N, 3), tile_dtype, buffer=image.buf)) # copied out of the shared block
+        return f.finish_framebuffer(img, dtype, out)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
\ No newline at end of file
@@ -1,43 +1,141 @@
 import numpy as np
-from functions import vector_interp, gouraud_shading
+from functions import gouraud_shading, gouraud_shading_depth, batch_fragments, resolve_fragments, count, framebuffer, finish_framebuffer
+from functions import depthbuffer, window_parts, triangle_windows
 import transformations as trans
 from shaders import *
 import lighting as l
+from scene import Scene
+import tiles
+import bvh
 
 def bilerp(uv, texture_map):
     # uv: 1x2, the uv coordinates of the point
-    # texture_map: MxMx3, the texture map
-    # returns: 1x3, the color of the point
+    # texture_map: MxMx3, the texture map (a uint8 texture is divided by 255 when it is read)
+    # returns: 1x3, the color of the point (bilerp_array for one point)
+    return bilerp_array(np.reshape(np.asarray(uv, dtype=float), (1, 2)), texture_map)[0]
+
+def bilerp_array(uv, texture_map):
+    # uv: P x 2, the uv coordinates of the points
+    # texture_map: MxMx3, the texture map (a uint8 texture is divided by 255 when it is read)
+    # returns: P x 3, the colors of the points, with one gather
+    #          (uv outside [0, 1] is clamped to the border of the texture)
     M, N, _ = texture_map.shape
-    
+
     # Calculate the pixel coordinates
-    x = uv[0] * (N - 1)
-    y = uv[1] * (M - 1)
+    x = np.clip(uv[:, 0], 0, 1) * (N - 1)
+    y = np.clip(uv[:, 1], 0, 1) * (M - 1)
 
     # Get the four surrounding pixel coordinates
-    x0 = int(np.floor(x))
-    x1 = min(x0 + 1, N - 1)
-    y0 = int(np.floor(y))
-    y1 = min(y0 + 1, M - 1)
-
-    # Get the values at the corners of the rectangle of the area that the point belongs to in the texture map
-    f00 = texture_map[y0, x0] # the pixel
-    f01 = texture_map[y1, x0] # the upper pixel
-    f10 = texture_map[y0, x1] # the right pixel
-    f11 = texture_map[y1, x1] # the upper right pixel
-    
-    # Interpolate along x-axis at the bottom (y0)
-    Vx0 = vector_interp([x0, y0], [x1, y0], f00, f10, x, 1)
-    
-    # Interpolate along x-axis at the top (y1)
-    Vx1 = vector_interp([x0, y1], [x1, y1], f01, f11, x, 1)
-    
-    # Interpolate along y-axis using the results from x-axis interpolation
-    color = vector_interp([x0, y0], [x0, y1], Vx0, Vx1, y, 2)
+    x0 = np.floor(x).astype(int)
+    x1 = np.minimum(x0 + 1, N - 1)
+    y0 = np.floor(y).astype(int)
+    y1 = np.minimum(y0 + 1, M - 1)
+
+    # The interpolation factors, on the last row or column both pixels are the same one and it is kept
+    ax = np.where(x1 == x0, 0, x - x0.astype(x.dtype))[:, np.newaxis]
+    ay = np.where(y1 == y0, 0, y - y0.astype(y.dtype))[:, np.newaxis]
+
+    # Interpolate along x-axis at the bottom (y0) and at the top (y1), then along y-axis
+    Vx0 = texture_map[y0, x0] * (1 - ax) + texture_map[y0, x1] * ax
+    Vx1 = texture_map[y1, x0] * (1 - ax) + texture_map[y1, x1] * ax
+    color = Vx0 * (1 - ay) + Vx1 * ay
+    if texture_map.dtype == np.uint8:
+        color = color / 255
+    return color
+
+def build_mipmaps(texture_map, dtype=None):
+    # texture_map: A x B x 3, the texture map with values in [0, 1] (or uint8 values in [0, 255])
+    # dtype: np.float64, np.float32 or np.uint8, the type of the stored levels (uint8 levels keep the values times 255)
+    #        None keeps the type of the texture, so the levels add a third of the texture and not a float copy of it
+    # returns: the mipmaps, a dictionary with
+    #   "levels": list of the levels, the first is the texture and every next one is half of the previous one
+    #             (each pixel the mean of 2 x 2 pixels) down to 1 x 1 - all together about 4/3 of the texture
+    #   "texels": T x 3, all the levels one after the other in one array (the levels are views of it)
+    #   "shape":  L x 2, the height and width of every level
+    #   "offset": L, the index in texels of the first pixel of every level
+    if dtype is None:
+        dtype = np.asarray(texture_map).dtype.type
+    if dtype not in (np.float64, np.float32, np.uint8):
+        raise ValueError("Invalid mipmap type. Choose np.float64, np.float32 or np.uint8.")
+    level = np.asarray(texture_map, dtype=np.float64 if dtype == np.float64 else np.float32)
+    if np.asarray(texture_map).dtype == np.uint8:
+        level = level / 255
+    levels = [level]
+    while level.shape[0] > 1 or level.shape[1] > 1:
+        # An odd row or column is repeated so that it is averaged with itself
+        if level.shape[0] % 2:
+            level = np.concatenate([level, level[-1:]], axis=0)
+        if level.shape[1] % 2:
+            level = np.concatenate([level, level[:, -1:]], axis=1)
+        level = (level[0::2, 0::2] + level[1::2, 0::2] + level[0::2, 1::2] + level[1::2, 1::2]) / 4
+        levels.append(level)
+    if dtype == np.uint8:
+        levels = [np.round(level * 255) for level in levels]
+
+    # One array for all the levels so that a point of any level is read with one gather
+    shape = np.array([level.shape[:2] for level in levels])
+    sizes = shape[:, 0] * shape[:, 1]
+    offset = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    texels = np.concatenate([level.reshape(-1, 3) for level in levels]).astype(dtype)
+    return {
+        "levels": [texels[o:o + s].reshape(h, w, 3) for o, s, (h, w) in zip(offset, sizes, shape)],
+        "texels": texels,
+        "shape": shape,
+        "offset": offset,
+    }
+
+def triangle_lod(vertices_triangle, uv_triangle, texture_shape):
+    # vertices_triangle: NT x 3 x 2, the pixel coordinates of the vertices of every triangle
+    # uv_triangle: NT x 3 x 2, the uv coordinates of the vertices of every triangle
+    # texture_shape: the shape of the full resolution texture
+    # returns: NT, the mipmap level of every triangle - log2 of the texels that one pixel covers along a side
+    #          (the uv derivatives on the image are constant on a triangle so the ratio of the areas gives them)
+    def area(p):
+        e1 = p[:, 1] - p[:, 0]
+        e2 = p[:, 2] - p[:, 0]
+        return np.abs(e1[:, 0] * e2[:, 1] - e1[:, 1] * e2[:, 0]) / 2
+    texel_area = area(uv_triangle) * (texture_shape[0] - 1) * (texture_shape[1] - 1)
+    pixel_area = area(vertices_triangle.astype(float))
+    # a triangle covers at least one pixel, a triangle without texture area gets the full resolution
+    return 0.5 * np.log2(np.maximum(texel_area, 1e-12) / np.maximum(pixel_area, 1))
+
+def trilinear(uv, lod, mipmaps):
+    # uv: P x 2, the uv coordinates of the points
+    # lod: P, the mipmap level of every point (a number between the levels blends the two levels)
+    # mipmaps: the mipmaps of build_mipmaps
+    # returns: P x 3, the colors of the points - bilinear in the two nearest levels and linear between them
+    texels = mipmaps["texels"]
+    levels = len(mipmaps["offset"])
+    lod = np.clip(lod, 0, levels - 1)
+    level0 = np.floor(lod).astype(int)
+    level1 = np.minimum(level0 + 1, levels - 1)
+    t = (lod - level0)[:, np.newaxis]
+
+    def bilerp_level(level):
+        # The same as bilerp_array, every point on its own level (uv clamped to the border of the level)
+        M, N = mipmaps["shape"][level].T
+        x = np.clip(uv[:, 0], 0, 1) * (N - 1)
+        y = np.clip(uv[:, 1], 0, 1) * (M - 1)
+        x0 = np.floor(x).astype(int)
+        x1 = np.minimum(x0 + 1, N - 1)
+        y0 = np.floor(y).astype(int)
+        y1 = np.minimum(y0 + 1, M - 1)
+        ax = np.where(x1 == x0, 0, x - x0)[:, np.newaxis]
+        ay = np.where(y1 == y0, 0, y - y0)[:, np.newaxis]
+        row0 = mipmaps["offset"][level] + y0 * N
+        row1 = mipmaps["offset"][level] + y1 * N
+        Vx0 = texels[row0 + x0] * (1 - ax) + texels[row0 + x1] * ax
+        Vx1 = texels[row1 + x0] * (1 - ax) + texels[row1 + x1] * ax
+        return Vx0 * (1 - ay) + Vx1 * ay
+
+    color = bilerp_level(level0) * (1 - t) + bilerp_level(level1) * t
+    if texels.dtype == np.uint8:
+        color = color / 255
     return color
 
 def render_object_map(shader, focal, eye, lookat, up, bg_color, M, N, H, W,
-                  verts, vert_colors, faces, ka, kd, ks, n, lpos, lint, light_amb, uvs, uvs_faces, texture_map):
+                  verts, vert_colors, faces, ka, kd, ks, n, lpos, lint, light_amb, uvs, uvs_faces, texture_map, zbuffer=False, stats=None, scene=None, sampling="vertex", filtering="bilinear", mipmaps=None, dtype=np.float64, out=None,
+                  workers=None, triangles=None, cull=False, frustum=False, window=None):
     # shader: string {"gouraud", "phong"} deciding the coloring function
     # focal: number, the distance of the projection from the centre of the camera
     # eye:   3 x 1, the coordinates of the centre of the camera
@@ -60,49 +158,173 @@ def render_object_map(shader, focal, eye, lookat, up, bg_color, M, N, H, W,
     # uvs: 2 x Nverts, the uv coordinates of the vertices of the object
     # uvs_faces: 3 x Nfaces, the uv coordinates of the triangles of the object
     # texture_map: A x B x 3, the texture map
+    # zbuffer: if True the visibility is decided per pixel with a depth buffer instead of sorting the triangles by depth
+    # stats: optional dictionary, with zbuffer it gets the counters of the render: "fragments", "fragments_hidden",
+    #        "light_evals" (calls of lighting.light) and "light_saved" (the calls that the depth test avoided)
+    # scene: optional Scene, keeps the normals, the projection and the order of the triangles, the texture colors between the renders
+    #        of the same object and camera (e.g. a sweep of ka, kd, ks, n or of the lights only redoes the shading)
+    # sampling: "vertex" reads the texture at the vertices and interpolates the colors,
+    #           "pixel" reads the texture at every pixel with perspective correct uv (see render_object_map_pixel)
+    # filtering: "bilinear" reads the full resolution texture, "trilinear" reads the mipmaps of the texture
+    #            at the level that matches the size of each triangle on the image
+    # mipmaps: optional levels of build_mipmaps for trilinear (e.g. uint8 levels), else levels of the type of texture_map are built once
+    #          from texture_map and kept in the scene
+    # dtype: the type of the image - np.float64, np.float32 or np.uint8 for a BGR image with values 0-255 (functions.framebuffer)
+    # out: optional M x N x 3 array which gets the image, to reuse the memory of a previous render
+    # workers: the number of processes that render the tiles of the image (tiles.render_tiled), None renders in this process
+    #          the image is exactly the same
+    # triangles: the triangles that are drawn in the order that they are drawn, None for all of them (scene.triangle_order)
+    # cull: if True the triangles behind the camera, outside the image and facing away from the camera are not drawn
+    #       (transformations.cull_triangles), stats gets the counters of the culled triangles
+    # frustum: if True the triangles outside the frustum of the camera are not drawn (bvh.frustum_triangles)
+    # window: optional y0, y1, x0, x1, only this rectangle of the image is drawn and the rest of out is not touched
+    #         (the tiles of tiles.render_tiled), the rectangle gets the same pixels as the whole render
+
+    if filtering not in ("bilinear", "trilinear"):
+        raise ValueError("Invalid filtering. Choose 'bilinear' or 'trilinear'.")
+    if sampling not in ("vertex", "pixel"):
+        raise ValueError("Invalid sampling. Choose 'vertex' or 'pixel'.")
+    if scene is None:
+        scene = Scene() # nothing is kept after this render
+
+    if workers is not None and workers > 1 and stats is not None:
+        raise ValueError("The stats of a render are not counted with workers.")
+    if cull or frustum:
+        pixel_coords, depth_values = scene.projection(verts, focal, eye, lookat, up, M, N, H, W)
+        if triangles is None:
+            triangles = scene.triangle_order(faces, depth_values, zbuffer or sampling == "pixel")
+        # the culled triangles are dropped from the sorted order, the others are drawn in the same order as without culling
+        if frustum:
+            triangles = triangles[bvh.frustum_triangles(scene.bvh(verts, faces, bvh.build_bvh), focal, eye, lookat, up, M, N, H, W)[triangles]]
+        if cull:
+            triangles = triangles[trans.cull_triangles(verts, faces, eye, pixel_coords, depth_values, M, N, stats)[triangles]]
+
+    if workers is not None and workers > 1:
+        pixel_coords, depth_values = scene.projection(verts, focal, eye, lookat, up, M, N, H, W)
+        if triangles is None:
+            # the pixel sampling always draws with a depth buffer
+            triangles = scene.triangle_order(faces, depth_values, zbuffer or sampling == "pixel")
+        arguments = dict(shader=shader, focal=focal, eye=eye, lookat=lookat, up=up, bg_color=bg_color, M=M, N=N, H=H, W=W,
+                         verts=verts, vert_colors=vert_colors, faces=faces, ka=ka, kd=kd, ks=ks, n=n,
+                         lpos=lpos, lint=lint, light_amb=light_amb, uvs=uvs, uvs_faces=uvs_faces, texture_map=texture_map,
+                         zbuffer=zbuffer, sampling=sampling, filtering=filtering, mipmaps=mipmaps)
+        return tiles.render_tiled("tmap", "render_object_map", arguments, ("verts", "vert_colors", "faces", "uvs", "uvs_faces", "texture_map"),
+                                  pixel_coords, faces, triangles, M, N, workers, dtype=dtype, out=out)
+    if sampling == "pixel":
+        return render_object_map_pixel(shader, focal, eye, lookat, up, bg_color, M, N, H, W, verts, vert_colors, faces,
+                                       ka, kd, ks, n, lpos, lint, light_amb, uvs, uvs_faces, texture_map, stats, scene, filtering, mipmaps, dtype, out, triangles, window)
 
     #* 1) Calculate the normals of the vertices
-    normals = l.calculate_normals(verts, faces)
+    normals = scene.normals(verts, faces)
     #* 2) Project the vertices onto the camera plane using the perspective_project function from transformations.py
     # The triangles outside the camera plane are not visible thus are not colored
-    # Calculate the rotation matrix and translation vector
-    R, t = trans.lookat(eye, up, lookat)
-    # Project the vertices
-    projected_verts, depth_values = trans.perspective_project(verts, focal, R, t) 
-    # projected_verts: 2 x Nv and depth_values: 1 x Nv
     # Rasterize the projected vertices to image pixel coordinates
-    pixel_coords = trans.rasterize(projected_verts, W, H, N, M).astype(int)
-    # pixel_coords: 2 x Nv
+    pixel_coords, depth_values = scene.projection(verts, focal, eye, lookat, up, M, N, H, W)
+    # pixel_coords: 2 x Nv and depth_values: 1 x Nv
+    # The colors of the texture at the vertices of every triangle - NT x 3 x 3
+    if filtering == "trilinear":
+        uv_triangle = uvs[:, uvs_faces].transpose(1, 2, 0) # NT x 3 x 2
+        lod = triangle_lod(pixel_coords[:, faces].transpose(2, 1, 0), uv_triangle, texture_map.shape)
+        if mipmaps is None:
+            mipmaps = scene.mipmaps(texture_map, build_mipmaps)
+        uv_colors = trilinear(uv_triangle.reshape(-1, 2), np.repeat(lod, 3), mipmaps).reshape(-1, 3, 3)
+    else:
+        uv_colors = scene.uv_colors(uvs, uvs_faces, texture_map, bilerp_array)
     # Initialize the image
-    img = np.full((M, N, 3), bg_color) # Create an image with MxNx3 dimensions with the backround color
-    # Compute triangle_depth
-    triangle_depth = np.mean(depth_values[faces], axis=0)
-    # Sorting the array by descending depth
-    sorted_triangles_asc = np.argsort(triangle_depth)
-    sorted_triangles_desc = sorted_triangles_asc[::-1]
+    img = framebuffer((M, N), bg_color, dtype, out, window) # Create an image with MxNx3 dimensions with the backround color
+    # Sort the triangles by their depth
+    # with zbuffer the depth buffer decides the visibility, the triangles are drawn from the nearest to the farthest
+    # so that the depth test rejects the hidden fragments before they are lit, else by descending depth
+    if triangles is None:
+        triangles = scene.triangle_order(faces, depth_values, zbuffer)
+    zbuf = depthbuffer((M, N), window) if zbuffer else None
+    parts = window_parts(window, (M, N))
 
-    for triangle in sorted_triangles_desc:
+    for triangle in triangles:
 
         vertices_triangle = faces[:, triangle] # size 3x1 - the indices of the vertices of the triangle
         vertices_triangle2d = pixel_coords[:, vertices_triangle].T # 3x2 - the pixel coordinates of the vertices of the triangle
         # pixel_coords 2xNv so vertices_triangle2d are 3x2
         bcoords = np.mean(verts[:, vertices_triangle], axis=0).T
+        depth_triangle = depth_values[vertices_triangle]
 
-        uv_triangle = uvs_faces[triangle, :] # trigwno sto texture map? to trigwno antistoizetai akribws??
-        uv_coords = uvs[:, uv_triangle].T # 3x2 - the uv coordinates of the vertices of the triangle
-
-        vcolors_triangle = np.array([
-            bilerp(uv_coords[0], texture_map),
-            bilerp(uv_coords[1], texture_map),
-            bilerp(uv_coords[2], texture_map)
-        ]).T
+        vcolors_triangle = uv_colors[triangle].T # 3x3 - the colors of the texture at the vertices of the triangle
         
-        if shader == "gouraud":
-            img = shade_gouraud(vertices_triangle2d.T, normals[:, vertices_triangle], vcolors_triangle, bcoords, eye, ka, kd, ks, n, lpos, lint, light_amb, img)
-        elif shader == "phong":
-            img = shade_phong(vertices_triangle2d.T, normals[:, vertices_triangle], vcolors_triangle, bcoords, eye, ka, kd, ks, n, lpos, lint, light_amb, img)
-        elif shader == "nolight":
-            img = gouraud_shading(img, vertices_triangle2d, vcolors_triangle.T)
-        else:
-            raise ValueError("Invalid shader type. Choose 'gouraud' or 'phong' or 'nolight'.")
-    return img
\ No newline at end of file
+        for part in triangle_windows(vertices_triangle2d, parts):
+            if shader == "gouraud":
+                img = shade_gouraud(vertices_triangle2d.T, normals[:, vertices_triangle], vcolors_triangle, bcoords, eye, ka, kd, ks, n, lpos, lint, light_amb, img, depth_triangle, zbuf, stats, part)
+            elif shader == "phong":
+                img = shade_phong(vertices_triangle2d.T, normals[:, vertices_triangle], vcolors_triangle, bcoords, eye, ka, kd, ks, n, lpos, lint, light_amb, img, depth_triangle, zbuf, stats, part)
+            elif shader == "nolight" and zbuffer:
+                img = gouraud_shading_depth(img, vertices_triangle2d, vcolors_triangle.T, depth_triangle, zbuf, part)
+            elif shader == "nolight":
+                img = gouraud_shading(img, vertices_triangle2d, vcolors_triangle.T, window=part)
+            else:
+                raise ValueError("Invalid shader type. Choose 'gouraud' or 'phong' or 'nolight'.")
+
+    if stats is not None and zbuffer:
+        # Phong lights every fragment, Gouraud the three vertices of every triangle
+        stats["light_saved"] = stats.get("fragments_hidden", 0) if shader == "phong" else 3 * stats.get("triangles_hidden", 0)
+    return finish_framebuffer(img, dtype, out)
+
+def render_object_map_pixel(shader, focal, eye, lookat, up, bg_color, M, N, H, W,
+                  verts, vert_colors, faces, ka, kd, ks, n, lpos, lint, light_amb, uvs, uvs_faces, texture_map, stats=None, scene=None, filtering="bilinear", mipmaps=None, dtype=np.float64, out=None, triangles=None, window=None):
+    # The same arguments as render_object_map, the texture is read at every pixel instead of the vertices
+    # All the triangles are rasterized at once with a depth buffer and at every visible pixel the uv coordinates are
+    # interpolated perspective correct (u/z, v/z and 1/z are linear on the image, u and v are not)
+    #   "nolight": the color of the pixel is the texture
+    #   "phong":   the texture is the color of the point that is lit at every pixel
+    #   "gouraud": the diffuse and specular light of the vertices (for a white color) is interpolated and multiplies the texture
+    # stats: optional dictionary, gets the "fragments" and "fragments_hidden" counters
+    if shader not in ("gouraud", "phong", "nolight"):
+        raise ValueError("Invalid shader type. Choose 'gouraud' or 'phong' or 'nolight'.")
+    if scene is None:
+        scene = Scene()
+    normals = scene.normals(verts, faces)
+    pixel_coords, depth_values = scene.projection(verts, focal, eye, lookat, up, M, N, H, W)
+
+    # The triangles from the nearest to the farthest, as render_object_map with zbuffer
+    order = scene.triangle_order(faces, depth_values, True) if triangles is None else triangles
+    faces = faces[:, order]
+    uvs_faces = uvs_faces[order]
+
+    # Keep the nearest fragment of every pixel
+    vertices_triangle = pixel_coords[:, faces].transpose(2, 1, 0) # NT x 3 x 2
+    # with a window the fragments of each of its parts, the fragments of a pixel are resolved in the same order as without it
+    tri, ys, xs, weights = (np.concatenate(a) for a in zip(*(batch_fragments(vertices_triangle, M, N, window=part)
+                                                                for part in window_parts(window, (M, N)))))
+    fragments = len(tri) # the fragments of this render, stats can already hold the counts of other renders
+    count(stats, "fragments", fragments)
+    zbuf = depthbuffer((M, N), window)
+    tri, ys, xs, weights = resolve_fragments(tri, ys, xs, weights, N, depth_values[faces].T, zbuf)
+    count(stats, "fragments_hidden", fragments - len(tri))
+
+    # Perspective correct uv at every pixel
+    weights_z = weights / depth_values[faces[:, tri]].T # P x 3
+    uv_triangle = uvs[:, uvs_faces[tri]].transpose(1, 2, 0) # P x 3 x 2
+    uv = np.einsum('pk,pkc->pc', weights_z, uv_triangle) / np.sum(weights_z, axis=1)[:, np.newaxis]
+    if filtering == "trilinear":
+        lod = triangle_lod(vertices_triangle, uvs[:, uvs_faces].transpose(1, 2, 0), texture_map.shape)
+        if mipmaps is None:
+            mipmaps = scene.mipmaps(texture_map, build_mipmaps)
+        texture_colors = trilinear(uv, lod[tri], mipmaps)
+    else:
+        texture_colors = bilerp_array(uv, texture_map)
+
+    img = framebuffer((M, N), bg_color, dtype, out, window)
+    if shader == "nolight":
+        img[ys, xs] = texture_colors
+        return finish_framebuffer(img, dtype, out)
+
+    bcoords = np.mean(verts[:, faces], axis=0).T # NT x 3, the point that is lit for every triangle
+    if shader == "phong":
+        interp_normals = np.einsum('pk,ckp->pc', weights, normals[:, faces[:, tri]])
+        img[ys, xs] = l.light_batch(bcoords[tri], interp_normals, texture_colors, eye, ka * light_amb, kd, ks, n, lpos, lint)
+        return finish_framebuffer(img, dtype, out)
+
+    # Gouraud, the light of the vertices of every triangle without the color - NT x 3 x 3
+    LN, VR, intensities = l.light_terms(np.repeat(bcoords, 3, axis=0), normals[:, faces.T.ravel()].T, eye, lpos, lint)
+    vertex_light = ((kd * np.maximum(LN, 0) + ks * VR ** n) @ intensities).reshape(-1, 3, intensities.shape[1])
+    interp_light = np.einsum('pk,pkc->pc', weights, vertex_light[tri])
+    img[ys, xs] = np.clip(ka * light_amb + texture_colors * interp_light, 0, 1)
+    return finish_framebuffer(img, dtype, out)
\ No newline at end of file
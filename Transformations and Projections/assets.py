@@ -0,0 +1,40 @@
+import os
+import numpy as np
+
+# Assets: every array of a data file is kept in its own .npy file in a directory and is opened memory mapped,
+# so only the pages that are actually read are loaded from the disk and nothing is copied at startup.
+# e.g. hw1.npy (one pickled dictionary) -> hw1.assets/vertices.npy, hw1.assets/faces.npy ...
+
+def save_assets(path, data):
+    # path: the directory of the assets
+    # data: dictionary of arrays, numbers and lists of numbers (a dictionary inside is kept in a subdirectory)
+    os.makedirs(path, exist_ok=True)
+    for name, value in data.items():
+        if isinstance(value, dict):
+            save_assets(os.path.join(path, name), value)
+        else:
+            np.save(os.path.join(path, name + '.npy'), np.asarray(value), allow_pickle=False)
+
+def load_assets(path):
+    # path: the directory of the assets
+    # returns: dictionary of the assets, the arrays memory mapped read only (np.load with mmap_mode='r')
+    #          and the numbers as numbers
+    data = {}
+    for entry in sorted(os.listdir(path)):
+        entry_path = os.path.join(path, entry)
+        if os.path.isdir(entry_path):
+            data[entry] = load_assets(entry_path)
+        elif entry.endswith('.npy'):
+            array = np.load(entry_path, mmap_mode='r')
+            data[entry[:-4]] = array.item() if array.ndim == 0 else array
+    return data
+
+def load(file):
+    # file: a .npy file with a pickled dictionary of the data (hw1.npy, hw2.npy, h3.npy)
+    # returns: the same dictionary as np.load(file, allow_pickle=True).item(), with memory mapped arrays
+    # The assets are written next to the file the first time (and again when the file is newer than them)
+    path = os.path.splitext(file)[0] + '.assets'
+    if not os.path.isdir(path) or os.path.getmtime(path) < os.path.getmtime(file):
+        save_assets(path, np.load(file, allow_pickle=True).item())
+        os.utime(path)
+    return load_assets(path)
\ No newline at end of file
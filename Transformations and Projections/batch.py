@@ -0,0 +1,91 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import transform as t
+from functions import share, attach
+
+# Batch rendering of a sequence of frames (an animation or a turntable): every frame is the same object with its own
+# transformation and/or camera. The frames are rendered by a pool of processes and are given back (and saved) in order.
+# The arrays of the object are put once in shared memory, every process opens them when it starts and they are not copied
+# to it with every frame, a frame only sends its 4x4 matrix and its camera (functions.share, functions.attach).
+
+# The object of the process, set by open_mesh when the process starts
+mesh = {}
+mesh_blocks = [] # the blocks must stay open while their arrays are used
+
+def open_mesh(specs):
+    # specs: the descriptions of the shared arrays of the object (share)
+    for name, spec in specs.items():
+        block, mesh[name] = attach(spec)
+        mesh_blocks.append(block)
+
+def frame_matrix(transform):
+    # transform: a transform.Transform, a 4x4 matrix or None
+    # returns: the 4x4 matrix of the transformation (the identity for None)
+    if transform is None:
+        return np.eye(4)
+    return np.asarray(getattr(transform, "mat", transform), dtype=float)
+
+def render_frame(matrix, camera, plane_h, plane_w, res_h, res_w, focal, rasterizer, zbuffer, dtype):
+    # matrix: the 4x4 matrix of the frame
+    # camera: eye, up, target of the frame
+    # returns: the rendered frame res_h x res_w x 3 (transform.render_object)
+    # the matrix is applied to the vertices together with the camera (transform.project_vertices)
+    model = None if np.array_equal(matrix, np.eye(4)) else matrix
+    eye, up, target = camera
+    return t.render_object(mesh["v_pos"], mesh["v_clr"], mesh["t_pos_idx"], plane_h, plane_w, res_h, res_w, focal, eye, up, target,
+                           rasterizer, zbuffer, dtype, model=model)
+
+def render_frames(v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w, focal, eye, up, target, frames,
+                  workers=None, pattern=None, rasterizer="span", zbuffer=False, dtype=np.uint8):
+    # v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w, focal: the same as in transform.render_object
+    # eye, up, target: the camera of the frames that do not have their own
+    # frames: list of dictionaries, one for each frame, with the optional keys
+    #   "transform": a transform.Transform or a 4x4 matrix which is applied to v_pos (none keeps the object as it is)
+    #   "eye", "up", "target": the camera of the frame
+    # workers: the number of processes that render the frames, None renders them one after the other in this process
+    # pattern: optional name of the files of the frames with the number of the frame, e.g. 'frame%03d.jpg' (cv2.imwrite)
+    #          each frame is saved as soon as it and all the frames before it are rendered
+    # rasterizer, zbuffer: the same as in transform.render_object
+    # dtype: the type of the frames - np.uint8 gives the BGR images that cv2.imwrite saves (transform.render_object)
+    # returns: generator of the rendered frames res_h x res_w x 3 in the order of frames
+    cameras = [(frame.get("eye", eye), frame.get("up", up), frame.get("target", target)) for frame in frames]
+    matrices = [frame_matrix(frame.get("transform")) for frame in frames]
+    options = (plane_h, plane_w, res_h, res_w, focal, rasterizer, zbuffer, dtype)
+
+    if workers is None or workers <= 1:
+        mesh.update(v_pos=v_pos, v_clr=v_clr, t_pos_idx=t_pos_idx)
+        try:
+            for i, (matrix, camera) in enumerate(zip(matrices, cameras)):
+                image = render_frame(matrix, camera, *options)
+                if pattern is not None:
+                    cv2.imwrite(pattern % i, image)
+                yield image
+        finally:
+            mesh.clear()
+        return
+
+    blocks = []
+    try:
+        specs = {}
+        for name, array in (("v_pos", v_pos), ("v_clr", v_clr), ("t_pos_idx", t_pos_idx)):
+            block, specs[name] = share(array)
+            blocks.append(block)
+        with ProcessPoolExecutor(max_workers=workers, initializer=open_mesh, initargs=(specs,)) as pool:
+            # at most two frames for each process are rendered ahead of the frame that is given back,
+            # a long sequence does not wait in memory
+            tasks = []
+            submitted = 0
+            for i in range(len(frames)):
+                while submitted < len(frames) and submitted < i + 2 * workers:
+                    tasks.append(pool.submit(render_frame, matrices[submitted], cameras[submitted], *options))
+                    submitted += 1
+                image = tasks[i].result()
+                tasks[i] = None
+                if pattern is not None:
+                    cv2.imwrite(pattern % i, image)
+                yield image
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
\ No newline at end of file
@@ -0,0 +1,88 @@
+import os
+import queue
+import threading
+import numpy as np
+import cv2
+import functions as f
+
+# Output of the renders: the frames are taken one at a time from the render loop (a generator), converted to uint8 BGR
+# into a few reused buffers and written by a background thread, so the next frame is rendered while the previous one
+# is encoded and no frame is kept after it is written.
+
+def frame_name(path, i):
+    # path: 'frame%03d.jpg' or a list of file names
+    # returns: the file of the ith frame
+    return path[i] if isinstance(path, (list, tuple)) else path % i
+
+def write_frames(frames, path, fps=25, buffers=3):
+    # frames: iterable (e.g. a generator of the render loop) of M x N x 3 images, RGB with values between 0 and 1
+    #         (float64 or float32) or the uint8 BGR images of dtype=np.uint8
+    # path: where the frames are written
+    #   a name with the number of the frame, e.g. 'frame%03d.jpg' or 'frame%d.png': one image for each frame (cv2.imwrite)
+    #   a video name '.mp4' or '.avi': all the frames in one video (cv2.VideoWriter)
+    #   a list of file names: one image for each frame
+    # fps: the frames per second of the video
+    # buffers: the number of uint8 images that the frames are converted into, the render waits when all of them
+    #          are waiting to be written
+    # returns: the number of frames that were written
+    video = isinstance(path, str) and os.path.splitext(path)[1].lower() in (".mp4", ".avi")
+    if isinstance(path, str) and not video and "%" not in path:
+        raise ValueError("Invalid path. Give a name with the frame number (e.g. 'frame%03d.jpg'), a .mp4 or .avi video or a list of names.")
+
+    free = queue.Queue() # the buffers that can be filled
+    full = queue.Queue() # the filled buffers in the order of the frames, None ends the writer
+    errors = []
+
+    def writer():
+        out = None
+        while True:
+            item = full.get()
+            if item is None:
+                break
+            i, buffer = item
+            try:
+                if errors:
+                    pass # after an error the buffers are only given back, so that the render loop does not wait for ever
+                elif video:
+                    if out is None:
+                        fourcc = cv2.VideoWriter_fourcc(*("mp4v" if path.lower().endswith(".mp4") else "MJPG"))
+                        out = cv2.VideoWriter(path, fourcc, fps, (buffer.shape[1], buffer.shape[0]))
+                        if not out.isOpened():
+                            raise ValueError("The video " + path + " cannot be written.")
+                    out.write(buffer)
+                elif not cv2.imwrite(frame_name(path, i), buffer):
+                    raise ValueError("The image " + frame_name(path, i) + " cannot be written.")
+            except Exception as error:
+                errors.append(error)
+            free.put(buffer)
+        if out is not None:
+            out.release()
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    count = 0
+    made = 0
+    try:
+        for frame in frames:
+            if errors:
+                break # the frames after an error are not rendered
+            # a new buffer until there are enough of them, then the next one that was written
+            if made < buffers:
+                buffer = None
+                made += 1
+            else:
+                buffer = free.get()
+            if buffer is None or buffer.shape != frame.shape:
+                buffer = np.empty(frame.shape, dtype=np.uint8)
+            if frame.dtype == np.uint8:
+                np.copyto(buffer, frame) # the render may reuse its out array for the next frame
+            else:
+                f.to_bgr8(frame, buffer)
+            full.put((count, buffer))
+            count += 1
+    finally:
+        full.put(None)
+        thread.join()
+    if errors:
+        raise errors[0]
+    return count
\ No newline at end of file
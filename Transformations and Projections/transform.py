@@ -4,16 +4,32 @@ import functions as f
 
 class Transform:
  # Interface for performing affine transformations.
+ # Every transformation is composed with the previous ones (the new matrix multiplies the current one from the left),
+ # so a chain of them is one 4x4 matrix and the points are transformed once, when transform_pts is called.
+ # The methods return the object so that they can be chained: Transform().rotate(theta, u).translate(t).transform_pts(pts)
     def __init__(self):
         # Initialize a Transform object.
         self.mat = np.eye(4) # Identity matrix
-    def rotate(self, theta: float, u: np.ndarray)-> None:
-        # rotate the transformation matrix
-        self.mat[:3, :3] = np.cos(theta) * np.eye(3) + (1 - np.cos(theta)) * np.outer(u, u) + np.sin(theta) * np.array([[0, -u[2], u[1]], [u[2], 0, -u[0]], [-u[1], u[0], 0]]) # Rodrigues' formula with homogeneous coordinates
-    def translate(self, t: np.ndarray)-> None: #just updates the matrix
-        # translate the transformation matrix.
+    def multiply(self, mat: np.ndarray)-> 'Transform':
+        # apply the 4x4 matrix mat after the current transformation
+        self.mat = np.matmul(mat, self.mat)
+        return self
+    def rotate(self, theta: float, u: np.ndarray)-> 'Transform':
+        # rotate around the unit axis u (through the origin) after the current transformation
+        u = np.asarray(u).flatten()
+        rotation = np.eye(4)
+        rotation[:3, :3] = np.cos(theta) * np.eye(3) + (1 - np.cos(theta)) * np.outer(u, u) + np.sin(theta) * np.array([[0, -u[2], u[1]], [u[2], 0, -u[0]], [-u[1], u[0], 0]]) # Rodrigues' formula with homogeneous coordinates
+        return self.multiply(rotation)
+    def translate(self, t: np.ndarray)-> 'Transform': #just updates the matrix
+        # translate after the current transformation.
         t = t.flatten() # Makes the 3x1 vector an one-dimensional array
-        self.mat[:3, 3] += t # The last column of the three rows 
+        self.mat[:3, 3] += t # The last column of the three rows - the same as multiplying with the translation matrix from the left
+        return self
+    def scale(self, s)-> 'Transform':
+        # scale by s (a number or 3 numbers, one for each axis) after the current transformation
+        scaling = np.eye(4)
+        scaling[:3, :3] *= np.asarray(s, dtype=float).flatten()
+        return self.multiply(scaling)
     def transform_pts(self, pts: np.ndarray)-> np.ndarray: #*input is a Nx3 array
         # transform the specified points according to our current matrix.
         pts = pts.T # Transpose the points to have a 3xN matrix
@@ -23,12 +39,43 @@ class Transform:
         return pts_transformed_without_homogeneous
 
 # OUTSIDE THE CLASS
+def transform_pts_batch(mats: np.ndarray, pts: np.ndarray, out: np.ndarray = None)-> np.ndarray:
+        # transform the same points with many matrices in one matmul (e.g. the poses of an animation or the instances of a mesh)
+        # mats: the transformation matrices Kx4x4 (e.g. np.stack of Transform.mat)
+        # pts: the points to transform Nx3 (as transform_pts)
+        # out: optional KxNx3 array which gets the result
+        # :return the transformed points KxNx3 - the kth is the same as Transform with mats[k] gives for pts (transposed)
+        mats = np.asarray(mats)
+        pts_homogeneous = np.hstack((pts, np.ones((pts.shape[0], 1)))) # Nx4
+        return np.matmul(pts_homogeneous, mats[:, :3, :].transpose(0, 2, 1), out=out) # (Nx4) x (Kx4x3) = KxNx3
+
+def transform_pts_chunks(mats: np.ndarray, pts: np.ndarray, max_points: int = 1 << 22):
+        # the same as transform_pts_batch for a KxN that does not fit in the memory: the matrices are transformed in chunks
+        # mats: the transformation matrices Kx4x4
+        # pts: the points to transform Nx3
+        # max_points: the number of transformed points that are kept at a time (at least the N points of one matrix)
+        # :return generator of (k, the transformed points of mats[k:k + chunk] chunk x N x 3)
+        #         the chunks are written in the same array, a chunk must be used (or copied) before the next one is asked for
+        chunk = max(1, max_points // max(pts.shape[0], 1))
+        buffer = np.empty((min(chunk, len(mats)), pts.shape[0], 3))
+        for k in range(0, len(mats), chunk):
+            block = buffer[:len(mats) - k] # the last chunk may be smaller
+            yield k, transform_pts_batch(mats[k:k + chunk], pts, out=block)
+
 def world2view(pts: np.ndarray, R: np.ndarray, c0: np.ndarray)-> np.ndarray:
         # Implements a world-to-view transform, i.e. transforms the specified points to the coordinate frame of a camera. The camera coordinate frame
         # is specified rotation (w.r.t. the world frame) and its point of reference (w.r.t. to the world frame).
         # pts: the points to transform 3xN - the columns contain the coordinates of the points
         # R: the conversion table of the new system with respect to the original one 3x3
-        # c0: the origin of the new system with respect to the original one 3x1
+        #    or Kx3x3 for K cameras, then the points are transformed to all of them in one call (transform_pts_batch)
+        # c0: the origin of the new system with respect to the original one 3x1 (Kx3 for K cameras)
+        # :return the transformed points Nx3 (KxNx3 for K cameras)
+        if np.ndim(R) == 3:
+            mats = np.zeros((len(R), 4, 4))
+            mats[:, :3, :3] = R
+            mats[:, :3, 3] = np.reshape(c0, (len(R), 3))
+            mats[:, 3, 3] = 1
+            return transform_pts_batch(mats, pts.T)
         transform_obj = Transform()
         transform_obj.mat[:3, :3] = R
         transform_obj.translate(c0) # I use c0 directly because c0 represents the origin of the new system.
@@ -57,16 +104,19 @@ def perspective_project(pts: np.ndarray, focal: float, R: np.ndarray, t: np.ndar
         # Project the specified 3d points pts on the image plane, according to a pinhole perspective projection model.
         # pts: the points to project 3xN
         # focal: the focal length of the camera
-        # R: the rotation matrix to the system of the camera 3x3
-        # t: the translation vector to the system of the camera 1x3
-        # :return a tuple containing the projected points 2xN and the depth values 1xN
+        # R: the rotation matrix to the system of the camera 3x3 (or Kx3x3 for K cameras)
+        # t: the translation vector to the system of the camera 1x3 (or Kx3 for K cameras)
+        # :return a tuple containing the projected points 2xN and the depth values 1xN (Kx2xN and KxN for K cameras)
         # Calculate the camera coordinates
         
-        camera_coords = world2view(pts, R, t.T) # Convert the points to the camera coordinate frame
-        camera_coords = camera_coords.T # The output of world2view is a Nx3 array but i want them at 3xN
-        depth_values = camera_coords[2] # The depth values are the z-coordinates of the camera coordinates
+        if np.ndim(R) == 3:
+            camera_coords = world2view(pts, R, t).transpose(0, 2, 1) # K cameras: Kx3xN
+        else:
+            camera_coords = world2view(pts, R, t.T) # Convert the points to the camera coordinate frame
+            camera_coords = camera_coords.T # The output of world2view is a Nx3 array but i want them at 3xN
+        depth_values = camera_coords[..., 2, :] # The depth values are the z-coordinates of the camera coordinates
         # Apply perspective projection
-        projected_pts = focal * camera_coords[:2] / depth_values # Equation (6.2) on course's notes
+        projected_pts = focal * camera_coords[..., :2, :] / depth_values[..., np.newaxis, :] # Equation (6.2) on course's notes
         
         return projected_pts, depth_values
     
@@ -88,7 +138,123 @@ def rasterize(pts_2d: np.ndarray, plane_w: int, plane_h: int, res_w: int, res_h:
         pixel_coords = np.around(scaled_coords) # Rounding in order to get the nearest pixel
         return pixel_coords
 
-def render_object(v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w, focal, eye, up, target)-> np.ndarray:
+def projection_matrix(focal: float, R: np.ndarray, t: np.ndarray, plane_w: float, plane_h: float, res_w: int, res_h: int, model: np.ndarray = None)-> np.ndarray:
+        # The whole vertex stage in one matrix: model transform, world-to-view (R, t), perspective projection and rasterization
+        # focal, R, t: the same as in perspective_project
+        # plane_w, plane_h, res_w, res_h: the same as in rasterize
+        # model: optional 4x4 matrix of the object (e.g. Transform.mat) which is applied before the camera
+        # :return the 3x4 matrix which gives [x * z, y * z, z] of a point [X, Y, Z, 1], x, y are the pixel coordinates
+        #         before the rounding and z is the depth
+        scale_w = res_w / plane_w
+        scale_h = res_h / plane_h
+        # rasterize after perspective_project: x = scale_w * (focal * xc / zc - plane_w / 2), the same with y
+        camera = np.array([[scale_w * focal, 0, -scale_w * plane_w / 2],
+                           [0, scale_h * focal, -scale_h * plane_h / 2],
+                           [0, 0, 1]])
+        view = np.hstack((R, np.reshape(t, (3, 1)))) # world2view as a 3x4 matrix
+        mat = np.matmul(camera, view)
+        if model is not None:
+            mat = np.matmul(mat, model)
+        return mat
+
+def project_vertices(pts: np.ndarray, focal: float, R: np.ndarray, t: np.ndarray, plane_w: float, plane_h: float, res_w: int, res_h: int,
+                     model: np.ndarray = None, out: np.ndarray = None)-> Tuple[np.ndarray, np.ndarray]:
+        # perspective_project and rasterize fused: one matrix (projection_matrix) and one matmul for all the vertices
+        # pts: the points to project 3xN
+        # model: optional 4x4 matrix of the object which is applied to pts first
+        # out: optional 3xN float array which gets the result, to reuse the memory between the calls
+        # :return a tuple containing the pixel coordinates 2xN and the depth values 1xN (views of out), the same as rasterize and perspective_project
+        mat = projection_matrix(focal, R, t, plane_w, plane_h, res_w, res_h, model)
+        if out is None:
+            out = np.empty((3, pts.shape[1]))
+        np.matmul(mat[:, :3], pts, out=out)
+        out += mat[:, 3:]
+        np.divide(out[:2], out[2], out=out[:2]) # the perspective divide
+        np.around(out[:2], out=out[:2]) # Rounding in order to get the nearest pixel
+        return out[:2], out[2]
+
+def cull_triangles(verts: np.ndarray, faces: np.ndarray, eye: np.ndarray, pixel_coords: np.ndarray, depth_values: np.ndarray,
+                   res_h: int, res_w: int, stats: dict = None)-> np.ndarray:
+        # The triangles that cannot be seen, found for all of them at once after the projection
+        #   behind:    a vertex is at the eye or behind it (depth <= 0), its projection is not valid
+        #   offscreen: the bounding box is outside the pixels that the rasterizers draw, [-res_w, res_w) x [-res_h, res_h)
+        #              (the negative coordinates are drawn from the end of the image)
+        #   backface:  the triangle faces away from the eye - its normal (p1 - p0) x (p2 - p0), the same as lighting uses,
+        #              points away from the eye (only for closed meshes with outward normals)
+        # verts: the coordinates of the vertices 3xN (world, the same that were projected)
+        # faces: the triangles 3xF (the indices of their vertices)
+        # eye: the camera's center 3x1
+        # pixel_coords, depth_values: the pixel coordinates 2xN and the depth values 1xN of the vertices (project_vertices)
+        # stats: optional dictionary, gets the counters "culled_behind", "culled_offscreen" and "culled_backface"
+        #        (each culled triangle is counted once, in this order)
+        # :return boolean array F, True for the triangles that are kept
+        behind = np.any(depth_values[faces] <= 0, axis=0)
+        corners = pixel_coords[:, faces] # 2 x 3 x F
+        low = np.min(corners, axis=1)
+        high = np.max(corners, axis=1)
+        offscreen = (high[0] < -res_w) | (low[0] >= res_w) | (high[1] < -res_h) | (low[1] >= res_h)
+        p0, p1, p2 = verts[:, faces[0]], verts[:, faces[1]], verts[:, faces[2]]
+        normals = np.cross(p1 - p0, p2 - p0, axis=0)
+        backface = np.sum(normals * (p0 - np.reshape(eye, (3, 1))), axis=0) > 0
+        offscreen &= ~behind
+        backface &= ~(behind | offscreen)
+        f.count(stats, "culled_behind", int(np.count_nonzero(behind)))
+        f.count(stats, "culled_offscreen", int(np.count_nonzero(offscreen)))
+        f.count(stats, "culled_backface", int(np.count_nonzero(backface)))
+        return ~(behind | offscreen | backface)
+
+def clip_near(verts: np.ndarray, faces: np.ndarray, depth_values: np.ndarray, near: float, *attributes: np.ndarray)-> Tuple:
+        # Cuts the triangles at the near plane (depth = near) so that only their part in front of the camera is rendered
+        #   in front of it: the triangle is kept as it is
+        #   behind it:      the triangle is dropped
+        #   crossing it:    with one vertex in front the triangle becomes a smaller triangle, with two a quad (two triangles),
+        #                   the new vertices are on the edges at depth = near and their attributes are interpolated along the edge
+        # The projection of a vertex behind the eye is not valid, so a triangle that crosses the plane of the camera
+        # is drawn from the projection of its visible part only
+        # verts: the coordinates of the vertices 3xN (world, the same that were projected)
+        # faces: the triangles 3xF
+        # depth_values: the depth values 1xN of the vertices (project_vertices)
+        # near: the depth of the near plane (> 0)
+        # attributes: other values of the vertices KxN (colors, normals, ...) which are interpolated with verts
+        # :return verts 3xN', faces 3xF' and the attributes KxN' of the clipped object
+        #         the new vertices are added after the old ones and the triangles keep their order
+        #         (the two triangles of a quad are at the place of the triangle that they come from)
+        front = depth_values[faces] >= near # 3 x F
+        count = np.sum(front, axis=0)
+        values = np.vstack((verts,) + attributes) # all the values of the vertices are interpolated together
+        added = [] # the new vertices
+        def cut(a, b):
+            # the points at depth = near on the edges a -> b (one for each triangle), returns their indices
+            s = (near - depth_values[a]) / (depth_values[b] - depth_values[a])
+            added.append(values[:, a] + s * (values[:, b] - values[:, a]))
+            first = values.shape[1] + sum(v.shape[1] for v in added[:-1])
+            return np.arange(first, first + len(a))
+
+        pieces = [faces[:, count == 3]]
+        sources = [np.flatnonzero(count == 3)] # the triangle that each piece comes from
+        for inside in (1, 2):
+            ids = np.flatnonzero(count == inside)
+            # a is the vertex which is alone on its side of the plane, b, c the other two in the order of the triangle (the winding is kept)
+            k = np.argmax(front[:, ids] == (inside == 1), axis=0)
+            a, b, c = faces[k, ids], faces[(k + 1) % 3, ids], faces[(k + 2) % 3, ids]
+            ab, ac = cut(a, b), cut(a, c)
+            if inside == 1:
+                pieces.append(np.stack([a, ab, ac]))
+                sources.append(ids)
+            else:
+                pieces += [np.stack([b, c, ac]), np.stack([b, ac, ab])] # the quad b, c, ac, ab
+                sources += [ids, ids]
+        order = np.argsort(np.concatenate(sources), kind="stable")
+        faces = np.hstack(pieces)[:, order].astype(faces.dtype)
+        values = np.hstack([values] + added)
+        rows = np.cumsum([len(verts)] + [len(a) for a in attributes])
+        clipped = np.split(values, rows[:-1])
+        # the vertices and the attributes keep their float type (float32 verts and normals stay float32, so a near plane
+        # that cuts no triangle gives exactly the same vertices and image as no near plane)
+        return (clipped[0].astype(np.result_type(verts, np.float32), copy=False), faces) + tuple(v.astype(np.result_type(a, np.float32)) for v, a in zip(clipped[1:], attributes))
+
+def render_object(v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w, focal, eye, up, target, rasterizer="span", zbuffer=False, dtype=np.float64, out=None, model=None,
+                  cull=False, stats=None, near=None)-> np.ndarray:
         # render the specified object from the specified camera.
         # v_pos: the coordinates of each vertex of the object Nx3
         # v_clr: the colors of a vertice of the object Nx3
@@ -101,23 +267,37 @@ def render_object(v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w, focal
         # eye: the camera's center 3x1
         # up: the camera's up vector 3x1
         # target: the camera's target 3x1
+        # rasterizer: the way the triangles are filled by render_img - "span", "pixel", "edge" or "batch"
+        # zbuffer: if True the visibility is decided per pixel with a depth buffer ("edge" and "batch" rasterizers)
+        # dtype: the type of the image - np.float64, np.float32 or np.uint8 for the BGR image that cv2.imwrite saves
+        # out: optional res_h x res_w x 3 array which gets the image, to reuse the memory of a previous render
+        # model: optional 4x4 matrix of the object (e.g. Transform.mat), applied to v_pos in the same matmul as the camera
+        # cull: if True the triangles behind the camera, outside the image and facing away from the camera are not rendered (cull_triangles)
+        # stats: optional dictionary, with cull it gets the counters of the culled triangles
+        # near: optional depth of the near plane, the triangles are cut at it and only their part in front of it is rendered (clip_near)
         # :return the rendered image res_h x res_w x 3
 
         # Calculate the rotation matrix R and translation vector t for the camera
         R, t = lookat(eye, up, target)
    
-        # Perform perspective projection on all vertices (inside the function we go from WCS to CCS)
-        projected_pts, depth_values = perspective_project(v_pos.T, focal, R, t) # The perspective_project function takes 3xN v_pos array as input
-        
-        # Rasterize the projected points to image pixel coordinates
-        pixel_coords = rasterize(projected_pts, plane_w, plane_h, res_w, res_h)
+        # Project all vertices to image pixel coordinates with one matrix (perspective_project and rasterize fused)
+        pixel_coords, depth_values = project_vertices(v_pos.T, focal, R, t, plane_w, plane_h, res_w, res_h, model) # The project_vertices function takes 3xN v_pos array as input
 
         # Prepare data for render_img function
         faces = t_pos_idx # The indices of the three vertices of triangle Fx3
+        if cull or near is not None:
+            world = v_pos.T if model is None else Transform().multiply(model).transform_pts(v_pos) # 3xN, the projected points
+        if near is not None:
+            # the new vertices are already in the world, the clipped object is projected without the model
+            world, faces, v_clr = clip_near(world, faces.T, depth_values, near, v_clr.T)
+            faces, v_clr = faces.T, v_clr.T
+            pixel_coords, depth_values = project_vertices(world, focal, R, t, plane_w, plane_h, res_w, res_h)
+        if cull:
+            faces = faces[cull_triangles(world, faces.T, eye, pixel_coords, depth_values, res_h, res_w, stats)]
         vertices = pixel_coords.T # The pixel coordinates of each vertex of the object Nx3
         vcolors = v_clr # The colors of the vertices of the object Nx3 in RGB
         depth = depth_values.T # The depth values of the vertices of the object Nx1
-        image = f.render_img(faces, vertices, vcolors, depth, "g") # The render_img function from hw1
+        image = f.render_img(faces, vertices, vcolors, depth, "g", rasterizer, zbuffer, dtype, out) # The render_img function from hw1
 
         # Return the rendered image
         return image
\ No newline at end of file
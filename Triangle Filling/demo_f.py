@@ -1,4 +1,5 @@
 import numpy as np
+import assets
 import matplotlib.pyplot as plt
 import cv2
 import functions
@@ -6,7 +7,8 @@ import functions
 shading = 'f'
 
 # Load data from .npy file
-data_dict = np.load('hw1.npy', allow_pickle=True).item()
+# The arrays are memory mapped from hw1.assets (written from hw1.npy the first time)
+data_dict = assets.load('hw1.npy')
 
 # Extract the data
 vertices = data_dict['vertices']
@@ -14,15 +16,12 @@ vcolors = data_dict['vcolors']
 faces = data_dict['faces']
 depth = data_dict['depth']
 
-# Render the image
-image = functions.render_img(faces,vertices,vcolors,depth,shading)
+# Render the image (float32 is enough for the colors and takes half the memory)
+image = functions.render_img(faces,vertices,vcolors,depth,shading,dtype=np.float32)
 
 # Since opencv library uses BGR format, we need to convert the image RGB to BGR
-# Convert the image to a compatible data type (uint8) before converting to BGR
-image_uint8 = np.clip(image * 255, 0, 255).astype(np.uint8)
-
-# Convert RGB to BGR
-image_bgr = cv2.cvtColor(image_uint8, cv2.COLOR_RGB2BGR)
+# to_bgr8 makes the uint8 BGR image directly, without the full size copies of np.clip, astype and cv2.cvtColor
+image_bgr = functions.to_bgr8(image)
 
 # ! In order the image to be saved, the path shouldnt have greek characters
 cv2.imwrite('flat_shading.jpg', image_bgr)
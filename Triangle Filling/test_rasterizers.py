@@ -0,0 +1,57 @@
+import os
+import numpy as np
+import functions
+
+# Equivalence of the rasterizers of render_img on hw1.npy
+# Run with: python -m pytest test_rasterizers.py (or python test_rasterizers.py)
+
+data_dict = np.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hw1.npy'), allow_pickle=True).item()
+vertices = data_dict['vertices']
+vcolors = data_dict['vcolors']
+faces = data_dict['faces']
+depth = data_dict['depth']
+
+images = {}
+def render(shading, rasterizer):
+    # the image of hw1 with the shading and the rasterizer, rendered once
+    if (shading, rasterizer) not in images:
+        images[shading, rasterizer] = functions.render_img(faces, vertices, vcolors, depth, shading, rasterizer)
+    return images[shading, rasterizer]
+
+def edge_pixels(ys, xs):
+    # returns True for each pixel (ys, xs) that lies on an edge of the triangle drawn there by the edge functions
+    # (the triangles in the order of render_img, the last one that covers the pixel)
+    sorted_faces = faces[np.argsort(np.mean(depth[faces], axis=1))[::-1]]
+    tri, fys, fxs, weights = functions.batch_fragments(vertices[sorted_faces].astype(float), functions.M, functions.N)
+    tri, fys, fxs, weights = functions.resolve_fragments(tri, fys, fxs, weights, functions.N)
+    on_edge = np.zeros((functions.M, functions.N), dtype=bool)
+    on_edge[fys, fxs] = np.any(weights == 0, axis=1)
+    return on_edge[ys, xs]
+
+def test_span_matches_pixel():
+    # The span fill gives the same image as the pixel by pixel fill
+    for shading in "fg":
+        assert np.array_equal(render(shading, "span"), render(shading, "pixel"))
+
+def test_gouraud_matches_scanline():
+    # The barycentric colors of the edge functions are the scan line interpolation of the same linear function,
+    # the zero area triangles get the colors of gouraud_shading (line_weights)
+    for rasterizer in ["edge", "batch"]:
+        assert np.allclose(render("g", rasterizer), render("g", "span"), rtol=0, atol=1e-12)
+
+def test_flat_matches_scanline():
+    # The edge functions are exact on the integer vertices of hw1 but the scan lines find the x of an edge with its slope and b,
+    # so a pixel that lies exactly on an edge can be lost (x = 308.0000000000001 gives x_left = 309) and the triangle drawn
+    # before keeps it. The images differ only in a few of these pixels (15 on hw1).
+    for rasterizer in ["edge", "batch"]:
+        difference = np.max(np.abs(render("f", rasterizer) - render("f", "span")), axis=-1)
+        ys, xs = np.nonzero(difference)
+        assert len(ys) <= 32
+        assert np.all(edge_pixels(ys, xs))
+    assert np.array_equal(render("f", "edge"), render("f", "batch"))
+
+if __name__ == "__main__":
+    test_span_matches_pixel()
+    test_gouraud_matches_scanline()
+    test_flat_matches_scanline()
+    print("The rasterizers are equivalent on hw1.npy")
\ No newline at end of file